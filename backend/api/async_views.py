@@ -0,0 +1,250 @@
+"""Async-версии горячих эндпоинтов чтения для запуска под ASGI.
+
+DRF 3.14 не умеет async-представления, поэтому здесь обычные async
+представления Django на async ORM. Они обслуживают только основной
+сценарий - GET с токеном или без. Ошибки параметров и пагинации
+(APIException) отдаются так же, как их отдаёт DRF. Всё остальное
+(запись, ошибки авторизации, курсорная пагинация, ?format) обрабатывает
+синхронное представление DRF через sync_to_async, так что ответы и
+число SQL-запросов совпадают с синхронными (api/tests/test_async_views.py).
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.module_loading import import_string
+from django_filters.utils import translate_validation
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from .conditional import (ingredients_etag, ingredients_last_modified,
+                          recipe_etag, recipe_last_modified, tags_etag,
+                          tags_last_modified)
+from .filters import RecipeFilter
+from .paginator import FoodgramPafination
+from .serializers import (IngredientSearchSerializer, IngredientSerializer,
+                          RecipesSerializer, TagSerializer)
+from .utils import ashopping_list
+
+
+def serves(sync_view, view):
+    """Async-представление view с запасным синхронным sync_view.
+
+    view возвращает None, когда запрос должен обработать синхронный DRF.
+    APIException превращается в ответ на месте: повторная обработка в
+    DRF заново проверила бы токен и повторила запросы. cls и actions
+    копируются, чтобы метрики и бюджеты запросов считались по той же
+    метке.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method == 'GET':
+            try:
+                response = await view(request, *args, **kwargs)
+            except APIException as exc:
+                response = render_exception(exc)
+            if response is not None:
+                return response
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    wrapper.cls = sync_view.cls
+    wrapper.actions = sync_view.actions
+    # Как у представлений DRF: CSRF проверяет только SessionAuthentication.
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def authenticate(request):
+    """TokenAuthentication на async ORM.
+
+    None означает, что заголовок неверный и ответ 401 сформирует DRF.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    token = await Token.objects.select_related('user').filter(
+        key=auth[1]).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+async def drf_request(request):
+    """Request DRF с пользователем для query_params и сериализаторов."""
+    user = await authenticate(request)
+    if user is None:
+        return None
+    request.user = user
+    wrapped = Request(request)
+    wrapped.user = user
+    if 'format' in wrapped.query_params:
+        return None
+    return wrapped
+
+
+def render(data, vary=()):
+    response = HttpResponse(JSONRenderer().render(data),
+                            content_type='application/json')
+    patch_vary_headers(response, (*vary, 'Accept'))
+    return response
+
+
+def render_exception(exc):
+    """Ответ на APIException с тем же телом и заголовками, что у DRF."""
+    error = exception_handler(exc, {})
+    response = render(error.data)
+    response.status_code = error.status_code
+    for header, value in error.items():
+        if header != 'Content-Type':
+            response[header] = value
+    return response
+
+
+async def conditional(request, etag_func, last_modified_func, respond,
+                      **kwargs):
+    """Декоратор condition для async-представлений.
+
+    ETag и дата изменения читаются из кэша и базы в потоке, respond -
+    корутина, которая строит ответ, если клиентская копия устарела.
+    """
+    def validators():
+        etag = etag_func(request, **kwargs)
+        modified = last_modified_func(request, **kwargs)
+        return (quote_etag(etag) if etag is not None else None,
+                int(modified.timestamp()) if modified else None)
+
+    etag, last_modified = await sync_to_async(validators)()
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await respond()
+    if response is None:
+        return None
+    # DRF добавляет Vary и к ответу 304.
+    patch_vary_headers(response, ('Accept',))
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+async def tag_list(request):
+    if await drf_request(request) is None:
+        return None
+
+    async def respond():
+        tags = [tag async for tag in Tag.objects.all()]
+        return render(TagSerializer(tags, many=True).data)
+
+    return await conditional(request, tags_etag, tags_last_modified, respond)
+
+
+async def ingredient_list(request):
+    wrapped = await drf_request(request)
+    if wrapped is None:
+        return None
+    params = IngredientSearchSerializer(data=wrapped.query_params)
+    params.is_valid(raise_exception=True)
+    name = params.validated_data.get('name')
+
+    async def respond():
+        if name:
+            ingredients = await sync_to_async(ingredient_index.search)(
+                name, params.validated_data.get('limit'))
+        else:
+            ingredients = [
+                ingredient async for ingredient in Ingredient.objects.all()]
+        return render(IngredientSerializer(ingredients, many=True).data)
+
+    return await conditional(request, ingredients_etag,
+                             ingredients_last_modified, respond)
+
+
+async def recipe_list(request):
+    wrapped = await drf_request(request)
+    if wrapped is None or wrapped.query_params.get('pagination') == 'cursor':
+        return None
+    filterset = RecipeFilter(
+        wrapped.query_params,
+        Recipe.objects.with_relations().with_user_flags(wrapped.user),
+        request=wrapped)
+    # Валидация тегов и полнотекстовый поиск обращаются к базе.
+    if not await sync_to_async(filterset.is_valid)():
+        raise translate_validation(filterset.errors)
+    queryset = await sync_to_async(lambda: filterset.qs)()
+    paginator = FoodgramPafination()
+    page = await paginator.apaginate_queryset(queryset, wrapped)
+    serializer = RecipesSerializer(page, many=True,
+                                   context={'request': wrapped})
+    return render(paginator.get_paginated_response(serializer.data).data)
+
+
+async def recipe_detail(request, pk):
+    wrapped = await drf_request(request)
+    if wrapped is None:
+        return None
+
+    async def respond():
+        recipe = await Recipe.objects.with_relations().with_user_flags(
+            wrapped.user).filter(pk=pk).afirst()
+        if recipe is None:
+            raise NotFound()
+        return render(RecipesSerializer(
+            recipe, context={'request': wrapped}).data, ('Authorization',))
+
+    return await conditional(request, recipe_etag, recipe_last_modified,
+                             respond, pk=pk)
+
+
+async def aiterate(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def download_shopping_cart(request):
+    user = await authenticate(request)
+    if user is None or user.is_anonymous:
+        return None
+    request.user = user
+    wrapped = Request(request)
+    wrapped.user = user
+    renderer = DefaultContentNegotiation().select_renderer(
+        wrapped, [import_string(renderer)()
+                  for renderer in settings.SHOPPING_LIST_RENDERERS])[0]
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type += f'; charset={renderer.charset}'
+    chunks = renderer.stream(await ashopping_list(user))
+    # Под WSGI Django не отдаёт async-итератор потоком.
+    response = StreamingHttpResponse(
+        aiterate(chunks) if isinstance(request, ASGIRequest) else chunks,
+        content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment;filename="Shoppingcart.{renderer.extension}"')
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+# (путь, имя маршрута DRF с синхронной версией, async-представление)
+ROUTES = (
+    ('tags/', 'tags-list', tag_list),
+    ('ingredients/', 'ingredients-list', ingredient_list),
+    ('recipes/', 'recipes-list', recipe_list),
+    ('recipes/<int:pk>/', 'recipes-detail', recipe_detail),
+    ('recipes/download_shopping_cart/', 'recipes-download-shopping-cart',
+     download_shopping_cart),
+)
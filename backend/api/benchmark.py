@@ -0,0 +1,372 @@
+import csv
+import json
+import math
+import os
+import re
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from http.client import HTTPConnection, HTTPSConnection
+from io import StringIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.test import Client
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .metrics import RequestMetrics
+
+Sample = namedtuple('Sample', 'status ttfb latency queries size')
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+BATCH = 20
+SLOW_CHUNK = 1024
+
+
+@contextmanager
+def counting():
+    """Считает SQL-запросы без журнала запросов (у него есть предел)."""
+    metrics = RequestMetrics()
+    with connection.execute_wrapper(metrics.record_query):
+        yield metrics
+
+
+def percentile(values, q):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+class ClientTransport:
+    """Запросы через тестовый клиент Django в этом же процессе.
+
+    SQL-запросы считаются по всему ответу, включая потоковое тело.
+    """
+
+    name = 'client'
+
+    def __init__(self):
+        host = settings.ALLOWED_HOSTS[0].strip()
+        self.client = Client(
+            SERVER_NAME='localhost' if host in ('', '*') else host,
+            raise_request_exception=False)
+
+    def request(self, method, path, token=None, data=None):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        body = '' if data is None else json.dumps(data)
+        with counting() as metrics:
+            started = time.perf_counter()
+            response = self.client.generic(
+                method, path, body, content_type='application/json',
+                **headers)
+            if response.streaming:
+                chunks = iter(response.streaming_content)
+                size = len(next(chunks, b''))
+                ttfb = time.perf_counter() - started
+                size += sum(len(chunk) for chunk in chunks)
+            else:
+                size = len(response.content)
+                ttfb = time.perf_counter() - started
+            latency = time.perf_counter() - started
+        return Sample(response.status_code, ttfb, latency,
+                      metrics.queries, size)
+
+
+class HTTPTransport:
+    """Запросы к запущенному серверу, например к gunicorn на localhost.
+
+    Число SQL-запросов берётся из заголовка Server-Timing; тело
+    потокового ответа в нём не учтено. С read_delay транспорт ведёт себя
+    как медленный клиент: читает тело по SLOW_CHUNK байт с паузой.
+    """
+
+    name = 'http'
+
+    def __init__(self, url, read_delay=0):
+        self.read_delay = read_delay
+        parts = urlsplit(url)
+        connection_class = (HTTPSConnection if parts.scheme == 'https'
+                            else HTTPConnection)
+        self.connection = connection_class(parts.netloc)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, token=None, data=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        body = None if data is None else json.dumps(data)
+        started = time.perf_counter()
+        self.connection.request(method, self.prefix + path, body, headers)
+        response = self.connection.getresponse()
+        size = len(response.read(1))
+        ttfb = time.perf_counter() - started
+        if self.read_delay:
+            while chunk := response.read(SLOW_CHUNK):
+                size += len(chunk)
+                time.sleep(self.read_delay)
+        else:
+            size += len(response.read())
+        latency = time.perf_counter() - started
+        match = SERVER_TIMING_QUERIES.search(
+            response.getheader('Server-Timing', ''))
+        return Sample(response.status, ttfb, latency,
+                      int(match[1]) if match else None, size)
+
+
+class Data:
+    """Образцы из базы, по которым строятся запросы сценариев."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.recipes = list(Recipe.objects.values_list('pk', flat=True))
+        self.tags = list(Tag.objects.values_list('slug', flat=True))
+        self.authors = list(User.objects.filter(
+            recipes_count__gt=0).order_by('-recipes_count').values_list(
+            'pk', flat=True)[:100])
+        self.prefixes = sorted({
+            name[:3] for name in Ingredient.objects.order_by(
+                '?').values_list('name', flat=True)[:200]
+        })
+        self.words = sorted({
+            word for name in Recipe.objects.order_by('?').values_list(
+                'name', flat=True)[:200]
+            for word in name.split() if word.isalpha()
+        })
+        self.reader = self.top('favorite_recipe')
+        self.buyer = self.top('shopping_cart')
+        self.follower = self.top('follower')
+        self.writer = User.objects.order_by('-recipes_count').first()
+        self.feed_readers = {
+            user.follower.count(): user
+            for user in User.objects.filter(username__regex=r'_follows_\d+$')
+        }
+
+    def top(self, relation):
+        return User.objects.annotate(
+            total=Count(relation)).order_by('-total').first()
+
+    def choice(self, values):
+        return self.rng.choice(values) if values else ''
+
+
+@lru_cache(maxsize=None)
+def token(user):
+    return Token.objects.get_or_create(user=user)[0].key
+
+
+def get(path, user=None):
+    return lambda transport: transport.request(
+        'GET', path, token(user) if user else None)
+
+
+def scenarios(data):
+    """{имя: функция, которая по транспорту выполняет одну итерацию}.
+
+    Сценарии без подходящих данных (например, без пользователей
+    {prefix}_follows_N из seed_synthetic) пропускаются.
+    """
+    if not data.recipes or data.reader is None:
+        return {}
+    rng = data.rng
+    reader = data.reader
+    found = {
+        'db_connection': reconnect,
+        'tags': lambda: get('/api/tags/'),
+        'ingredient_search': lambda: get(
+            f'/api/ingredients/?name={data.choice(data.prefixes)}'),
+        'recipe_list': lambda: get(
+            f'/api/recipes/?page={rng.randint(1, 5)}'),
+        'recipe_list_tags': lambda: get(
+            f'/api/recipes/?tags={data.choice(data.tags)}'
+            f'&tags={data.choice(data.tags)}'),
+        'recipe_list_author': lambda: get(
+            f'/api/recipes/?author={data.choice(data.authors)}'),
+        'recipe_list_favorited': lambda: get(
+            '/api/recipes/?is_favorited=1', reader),
+        'recipe_list_in_cart': lambda: get(
+            '/api/recipes/?is_in_shopping_cart=1', data.buyer),
+        'recipe_search': lambda: get(
+            f'/api/recipes/?search={data.choice(data.words)}'),
+        'recipe_popular': lambda: get('/api/recipes/?ordering=popular'),
+        'recipe_trending': lambda: get('/api/recipes/?ordering=trending'),
+        'recipe_detail': lambda: get(
+            f'/api/recipes/{data.choice(data.recipes)}/', reader),
+        'subscriptions': lambda: get(
+            '/api/users/subscriptions/', data.follower),
+        'shopping_cart': lambda: get(
+            '/api/recipes/download_shopping_cart/', data.buyer),
+    }
+    for count, user in data.feed_readers.items():
+        found[f'feed_{count}'] = (
+            lambda user=user: get('/api/recipes/feed/', user))
+    return found
+
+
+def write_scenarios(data):
+    """Запись пачкой против записи по одному и загрузка продуктов.
+
+    Каждая итерация выполняется в транзакции, которая откатывается,
+    поэтому сценарии доступны только с тестовым клиентом.
+    """
+    writer = data.writer
+    if writer is None:
+        return {}
+    # Токен создаётся до откатываемых транзакций.
+    key = token(writer)
+    own = list(Recipe.objects.filter(author=writer).values_list(
+        'pk', flat=True)[:BATCH])
+
+    def patches():
+        return [{'id': pk, 'cooking_time': data.rng.randint(1, 180)}
+                for pk in own]
+
+    def bulk_update():
+        return lambda transport: transport.request(
+            'PATCH', '/api/recipes/bulk/', key, patches())
+
+    def single_update():
+        def run(transport):
+            samples = [
+                transport.request('PATCH', f'/api/recipes/{item["id"]}/',
+                                  key, item)
+                for item in patches()
+            ]
+            return Sample(
+                max(sample.status for sample in samples),
+                samples[0].ttfb,
+                sum(sample.latency for sample in samples),
+                sum(sample.queries for sample in samples),
+                sum(sample.size for sample in samples),
+            )
+        return run
+
+    found = {
+        f'bulk_update_{len(own)}': bulk_update,
+        f'single_update_{len(own)}': single_update,
+        'loadmodels_per_row': lambda: load_ingredients(
+            data, '--no-copy', '--batch-size', '1'),
+        'loadmodels_bulk': lambda: load_ingredients(data, '--no-copy'),
+    }
+    if connection.vendor == 'postgresql':
+        found['loadmodels_copy'] = lambda: load_ingredients(data)
+    if not own:
+        return {}
+    return {name: rolled_back(make) for name, make in found.items()}
+
+
+def rolled_back(make):
+    def run(transport):
+        with transaction.atomic():
+            try:
+                return make()(transport)
+            finally:
+                transaction.set_rollback(True)
+    return lambda: run
+
+
+def load_ingredients(data, *args, rows=1000):
+    """Загрузка rows новых продуктов командой loadmodels."""
+    def run(transport):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', encoding='utf-8', newline='',
+                delete=False) as f:
+            csv.writer(f).writerows(
+                (f'benchmark {data.rng.random()} {i}', 'г')
+                for i in range(rows))
+        try:
+            with counting() as metrics:
+                started = time.perf_counter()
+                call_command('loadmodels', f.name, *args, stdout=StringIO())
+                latency = time.perf_counter() - started
+        finally:
+            os.unlink(f.name)
+        return Sample(200, latency, latency, metrics.queries, rows)
+    return run
+
+
+def reconnect():
+    """Один SQL-запрос между границами запроса, как в обработчике Django.
+
+    В начале и в конце запроса Django закрывает соединения старше
+    CONN_MAX_AGE (с пулом - возвращает в пул), так что сценарий
+    показывает цену подключения при текущих настройках. Тестовый клиент
+    эти сигналы отключает, поэтому в остальных сценариях её не видно.
+    """
+    def run(transport):
+        with counting() as metrics:
+            started = time.perf_counter()
+            close_old_connections()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            ttfb = time.perf_counter() - started
+            close_old_connections()
+            latency = time.perf_counter() - started
+        return Sample(200, ttfb, latency, metrics.queries, 0)
+    return run
+
+
+def run_scenario(transports, make, requests, warmup):
+    """requests итераций на каждый транспорт, по потоку на транспорт.
+
+    Кроме задержек считается пропускная способность: все итерации,
+    делённые на общее время.
+    """
+    def run(transport):
+        samples = []
+        for index in range(warmup + requests):
+            sample = make()(transport)
+            if index >= warmup:
+                samples.append(sample)
+        return samples
+
+    started = time.perf_counter()
+    if len(transports) == 1:
+        samples = run(transports[0])
+    else:
+        with ThreadPoolExecutor(len(transports)) as executor:
+            samples = [sample for part in executor.map(run, transports)
+                       for sample in part]
+    result = summarize(samples)
+    result['throughput_rps'] = round(
+        len(transports) * (warmup + requests)
+        / (time.perf_counter() - started), 1)
+    return result
+
+
+def summarize(samples):
+    latencies = [sample.latency * 1000 for sample in samples]
+    ttfbs = [sample.ttfb * 1000 for sample in samples]
+    queries = [sample.queries for sample in samples
+               if sample.queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(sample.status >= 400 for sample in samples),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'ttfb_p50_ms': round(percentile(ttfbs, 50), 2),
+        'ttfb_p95_ms': round(percentile(ttfbs, 95), 2),
+        'queries_mean': (round(sum(queries) / len(queries), 2)
+                         if queries else None),
+        'queries_max': max(queries) if queries else None,
+        'bytes_mean': round(sum(sample.size for sample in samples)
+                            / len(samples)),
+    }
+
+
+def dataset():
+    return {
+        'database': connection.vendor,
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'ingredients': Ingredient.objects.count(),
+        'tags': Tag.objects.count(),
+    }
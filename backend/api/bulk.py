@@ -0,0 +1,191 @@
+from django.db import transaction
+from recipes.images import release_image, schedule_variants
+from recipes.models import (Ingredient, IngredientAmount, Recipe,
+                            RecipeScore, Tag)
+from recipes.search import forget_search, update_search
+from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
+                                   HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST,
+                                   HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND)
+from users.models import User
+
+from .feed import invalidate_feeds
+from .serializers import RecipeEditSerializer
+from .utils import bump_cart_version, change_counter
+
+
+def as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def item_id(item):
+    return as_id(item.get('id') if isinstance(item, dict) else item)
+
+
+def preload(items):
+    """Все теги и ингредиенты пачки: по одному запросу на таблицу."""
+    tags, ingredients = set(), set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if isinstance(item.get('tags'), list):
+            tags.update(map(as_id, item['tags']))
+        if isinstance(item.get('ingredients'), list):
+            ingredients.update(map(item_id, item['ingredients']))
+    tags.discard(None)
+    ingredients.discard(None)
+    return {
+        Tag: Tag.objects.in_bulk(tags),
+        Ingredient: Ingredient.objects.in_bulk(ingredients),
+    }
+
+
+def load_recipes(items, user):
+    """Рецепты пачки одним запросом и ошибки для чужих и несуществующих."""
+    recipes = Recipe.objects.with_relations().in_bulk(
+        {item_id(item) for item in items} - {None})
+    errors = {}
+    for index, item in enumerate(items):
+        recipe = recipes.get(item_id(item))
+        if recipe is None:
+            errors[index] = error(index, HTTP_404_NOT_FOUND,
+                                  'Рецепт не найден')
+        elif recipe.author_id != user.pk:
+            errors[index] = error(index, HTTP_403_FORBIDDEN,
+                                  'Можно менять только свои рецепты')
+    return recipes, errors
+
+
+def reject_duplicates(items, errors):
+    """Рецепт, который встречается в пачке несколько раз, не меняется.
+
+    Иначе итог зависел бы от порядка элементов.
+    """
+    indexes = {}
+    for index, item in enumerate(items):
+        indexes.setdefault(item_id(item), []).append(index)
+    for pk, repeated in indexes.items():
+        if pk is None or len(repeated) == 1:
+            continue
+        for index in repeated:
+            errors.setdefault(index, error(
+                index, HTTP_400_BAD_REQUEST,
+                {'id': ['Рецепт указан в пачке несколько раз']}))
+
+
+def error(index, status, errors):
+    return {'index': index, 'status': status, 'errors': errors}
+
+
+def validate(items, context, instances=None, skip=()):
+    """Проверяет все элементы до записи.
+
+    Возвращает валидные сериализаторы по индексам и ошибки остальных.
+    """
+    context = {**context, 'preloaded': preload(items)}
+    valid, errors = {}, {}
+    for index, item in enumerate(items):
+        if index in skip:
+            continue
+        if instances is None:
+            serializer = RecipeEditSerializer(data=item, context=context)
+        else:
+            serializer = RecipeEditSerializer(
+                instances[item_id(item)], data=item, partial=True,
+                context=context)
+        if serializer.is_valid():
+            valid[index] = serializer
+        else:
+            errors[index] = error(index, HTTP_400_BAD_REQUEST,
+                                  serializer.errors)
+    return valid, errors
+
+
+def insert_recipes(serializers, user):
+    """Рецепты, рейтинги, связи с тегами и ингредиенты: по bulk_create."""
+    recipes = Recipe.objects.bulk_create([
+        Recipe(author=user, **{
+            field: value
+            for field, value in serializer.validated_data.items()
+            if field not in ('tags', 'ingredients')
+        })
+        for serializer in serializers
+    ])
+    tags, amounts = [], []
+    for recipe, serializer in zip(recipes, serializers):
+        data = serializer.validated_data
+        tags += [
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+            for tag in set(data['tags'])
+        ]
+        amounts += [
+            IngredientAmount(recipe_id=recipe.pk,
+                             ingredient_id=ingredient['id'],
+                             amount=ingredient['amount'])
+            for ingredient in data['ingredients']
+        ]
+    RecipeScore.objects.bulk_create(
+        [RecipeScore(recipe=recipe) for recipe in recipes])
+    Recipe.tags.through.objects.bulk_create(tags)
+    IngredientAmount.objects.bulk_create(amounts)
+    update_search([recipe.pk for recipe in recipes])
+    change_counter(User, user.pk, 'recipes_count', len(recipes))
+    transaction.on_commit(lambda: invalidate_feeds([user.pk]))
+    for recipe in recipes:
+        schedule_variants(recipe)
+    return recipes
+
+
+def delete_recipes(recipes, user):
+    Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]).delete()
+    forget_search()
+    change_counter(User, user.pk, 'recipes_count', -len(recipes))
+    transaction.on_commit(lambda: invalidate_feeds([user.pk]))
+    for recipe in recipes:
+        release_image(recipe.image.name, recipe.image_variants)
+
+
+def bulk_create(items, user, context, atomic=True):
+    valid, results = validate(items, context)
+    if atomic and results:
+        return results
+    with transaction.atomic():
+        recipes = insert_recipes(list(valid.values()), user)
+    for index, recipe in zip(valid, recipes):
+        results[index] = {'index': index, 'status': HTTP_201_CREATED,
+                          'id': recipe.pk}
+    return results
+
+
+def bulk_update(items, user, context, atomic=True):
+    recipes, results = load_recipes(items, user)
+    reject_duplicates(items, results)
+    valid, errors = validate(items, context, recipes, skip=results)
+    results.update(errors)
+    if atomic and results:
+        return results
+    with transaction.atomic():
+        for index, serializer in valid.items():
+            serializer.save()
+            results[index] = {'index': index, 'status': HTTP_200_OK,
+                              'id': serializer.instance.pk}
+    return results
+
+
+def bulk_delete(items, user, context, atomic=True):
+    recipes, results = load_recipes(items, user)
+    if atomic and results:
+        return results
+    deleted = {index: recipes[item_id(item)]
+               for index, item in enumerate(items) if index not in results}
+    unique = list({recipe.pk: recipe for recipe in deleted.values()}.values())
+    with transaction.atomic():
+        bump_cart_version(
+            User.objects.filter(shopping_cart__recipe__in=unique))
+        delete_recipes(unique, user)
+    for index, recipe in deleted.items():
+        results[index] = {'index': index, 'status': HTTP_204_NO_CONTENT,
+                          'id': recipe.pk}
+    return results
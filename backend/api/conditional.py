@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from hashlib import md5
+
+from recipes.models import Recipe
+from recipes.versions import INGREDIENTS, TAGS, get_version
+
+
+def make_etag(*parts):
+    return md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def version_modified(table):
+    return datetime.fromtimestamp(get_version(table), tz=timezone.utc)
+
+
+def tags_etag(request, *args, **kwargs):
+    return make_etag(TAGS, get_version(TAGS), kwargs.get('pk'))
+
+
+def tags_last_modified(request, *args, **kwargs):
+    return version_modified(TAGS)
+
+
+def ingredients_etag(request, *args, **kwargs):
+    # Разобранные параметры, а не QUERY_STRING: WSGI и ASGI по-разному
+    # декодируют его байты.
+    return make_etag(INGREDIENTS, get_version(INGREDIENTS), kwargs.get('pk'),
+                     request.GET.urlencode())
+
+
+def ingredients_last_modified(request, *args, **kwargs):
+    return version_modified(INGREDIENTS)
+
+
+def recipe_state(request, pk):
+    """Даты изменения рецепта и автора и флаги пользователя за запрос."""
+
+    if not hasattr(request, '_recipe_state'):
+        request._recipe_state = Recipe.objects.with_user_flags(
+            request.user
+        ).filter(pk=pk).values_list(
+            'updated', 'author__updated', 'is_in_favorite',
+            'is_in_shopping_cart', 'author_is_subscribed'
+        ).first()
+    return request._recipe_state
+
+
+def recipe_etag(request, *args, **kwargs):
+    state = recipe_state(request, kwargs.get('pk'))
+    if state is None:
+        return None
+    return make_etag(kwargs.get('pk'), request.user.pk, *state,
+                     get_version(TAGS), get_version(INGREDIENTS))
+
+
+def recipe_last_modified(request, *args, **kwargs):
+    # Флаги избранного и корзины меняются без изменения рецепта, поэтому
+    # для авторизованных проверка идёт только по ETag.
+    if request.user.is_authenticated:
+        return None
+    state = recipe_state(request, kwargs.get('pk'))
+    if state is None:
+        return None
+    return max(state[0], state[1], version_modified(TAGS),
+               version_modified(INGREDIENTS))
@@ -0,0 +1,85 @@
+import heapq
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from recipes.models import Recipe
+from recipes.versions import bump_version, bump_versions, get_version
+from users.models import Subscribe
+
+from .paginator import FoodgramCursorPagination
+
+
+def feed_table(user_id):
+    return f'feed:{user_id}'
+
+
+def invalidate_feeds(authors):
+    """Сбрасывает кэш ленты у всех подписчиков authors."""
+
+    if not settings.RECIPE_FEED_CACHE_TIMEOUT:
+        return
+    bump_versions([
+        feed_table(user_id)
+        for user_id in Subscribe.objects.filter(
+            author__in=authors).values_list('user_id', flat=True).distinct()
+    ])
+
+
+def invalidate_feed(user):
+    if settings.RECIPE_FEED_CACHE_TIMEOUT:
+        bump_version(feed_table(user.pk))
+
+
+def merge_feed(user, cursor, size):
+    """id первых size рецептов ленты, новые сверху.
+
+    Сначала для каждого автора по индексу (author, created) берётся его
+    последний рецепт до курсора. size-я по свежести из этих "голов" даёт
+    нижнюю границу: всё, что старше, в страницу не попадёт. Потоки рецептов
+    авторов выше границы сливаются k-way merge.
+    """
+
+    before = Recipe.objects.filter(author=OuterRef('author'))
+    if cursor is not None:
+        before = before.filter(FoodgramCursorPagination.before(cursor))
+    heads = list(Subscribe.objects.filter(user=user).annotate(
+        head=Subquery(before.order_by('-created', '-id').values(
+            'created')[:1])
+    ).filter(head__isnull=False).order_by('-head').values_list(
+        'head', flat=True)[:size])
+    if not heads:
+        return []
+
+    recipes = Recipe.objects.all()
+    if len(heads) == size:
+        recipes = recipes.filter(created__gte=heads[-1])
+    if cursor is not None:
+        recipes = recipes.filter(FoodgramCursorPagination.before(cursor))
+    rows = recipes.first_per_author(
+        Subscribe.objects.filter(user=user).values('author'), size
+    ).order_by('author_id', '-created', '-id').values_list(
+        'created', 'id', 'author_id')
+    streams = [
+        list(stream) for _, stream in groupby(rows, key=lambda row: row[2])
+    ]
+    return [
+        pk for _, pk, _ in islice(heapq.merge(*streams, reverse=True), size)
+    ]
+
+
+def feed_ids(user, cursor, size):
+    """merge_feed с кэшем на пользователя, если он включён."""
+
+    timeout = settings.RECIPE_FEED_CACHE_TIMEOUT
+    if not timeout:
+        return merge_feed(user, cursor, size)
+    key = (f'feed:{user.pk}:{get_version(feed_table(user.pk))}:'
+           f'{cursor and cursor[0].isoformat()}:{cursor and cursor[1]}:'
+           f'{size}')
+    ids = cache.get(key)
+    if ids is None:
+        ids = merge_feed(user, cursor, size)
+        cache.set(key, ids, timeout)
+    return ids
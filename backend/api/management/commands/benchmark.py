@@ -0,0 +1,119 @@
+import json
+import random
+
+from api.benchmark import (ClientTransport, Data, HTTPTransport, dataset,
+                           run_scenario, scenarios, write_scenarios)
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+COLUMNS = ('p50_ms', 'p95_ms', 'p99_ms', 'ttfb_p50_ms', 'queries_mean',
+           'throughput_rps', 'errors')
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет основные эндпоинты и сохраняет p50/p95/p99 '
+            'и число SQL-запросов в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url',
+                            help='Адрес запущенного сервера, например '
+                                 'http://127.0.0.1:8000; без него запросы '
+                                 'идут через тестовый клиент Django')
+        parser.add_argument('--requests', default=50, type=int,
+                            help='Измеряемых итераций на сценарий')
+        parser.add_argument('--warmup', default=5, type=int)
+        parser.add_argument('--concurrency', default=1, type=int,
+                            help='Параллельных клиентов (только с --url), '
+                                 'у каждого своё соединение')
+        parser.add_argument('--read-delay', default=0, type=float,
+                            help='Пауза в мс после каждых 1024 байт '
+                                 'ответа: медленные клиенты (только с --url)')
+        parser.add_argument('--scenarios',
+                            help='Имена сценариев через запятую')
+        parser.add_argument('--write', action='store_true',
+                            help='Добавить сценарии записи (изменения '
+                                 'откатываются)')
+        parser.add_argument('--seed', default=0, type=int)
+        parser.add_argument('--output', help='Куда записать JSON')
+        parser.add_argument('--compare',
+                            help='JSON прошлого запуска для сравнения')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля')
+        if options['write'] and options['url']:
+            raise CommandError('Сценарии записи работают только без --url')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должно быть больше нуля')
+        if ((options['concurrency'] > 1 or options['read_delay'])
+                and not options['url']):
+            raise CommandError(
+                '--concurrency и --read-delay работают только с --url')
+        data = Data(random.Random(options['seed']))
+        found = scenarios(data)
+        if options['write']:
+            found.update(write_scenarios(data))
+        if not found:
+            raise CommandError('Нет данных: сначала выполните seed_synthetic')
+        if options['scenarios']:
+            names = options['scenarios'].split(',')
+            unknown = set(names) - set(found)
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}; '
+                    f'доступны: {", ".join(found)}')
+            found = {name: found[name] for name in names}
+        if options['url']:
+            transports = [
+                HTTPTransport(options['url'], options['read_delay'] / 1000)
+                for _ in range(options['concurrency'])
+            ]
+        else:
+            transports = [ClientTransport()]
+        report = {
+            'started': timezone.now().isoformat(),
+            'transport': transports[0].name,
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'concurrency': options['concurrency'],
+            'read_delay_ms': options['read_delay'],
+            'seed': options['seed'],
+            'dataset': dataset(),
+            'scenarios': {},
+        }
+        self.stdout.write(f'{"scenario":<26}' + ''.join(
+            f'{column:>16}' for column in COLUMNS))
+        for name, make in found.items():
+            result = run_scenario(transports, make, options['requests'],
+                                  options['warmup'])
+            report['scenarios'][name] = result
+            self.stdout.write(f'{name:<26}' + ''.join(
+                f'{str(result[column]):>16}' for column in COLUMNS))
+        if options['compare']:
+            self.compare(options['compare'], report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Results saved to {options["output"]}'))
+
+    def compare(self, path, report):
+        try:
+            with open(path, encoding='utf-8') as f:
+                previous = json.load(f)['scenarios']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        self.stdout.write(f'\nCompared with {path}:')
+        for name, result in report['scenarios'].items():
+            if name not in previous:
+                continue
+            self.stdout.write(f'{name:<26}' + '   '.join(
+                self.change(column, previous[name][column], result[column])
+                for column in ('p50_ms', 'p95_ms', 'throughput_rps')
+                if column in previous[name]
+            ))
+
+    def change(self, column, before, after):
+        if not before:
+            return f'{column} {before} -> {after}'
+        return f'{column} {before} -> {after} (x{after / before:.2f})'
@@ -0,0 +1,294 @@
+import hmac
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry,
+                               Counter, Histogram, generate_latest)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+logger = logging.getLogger(__name__)
+
+# Каталог файлов метрик воркеров; prometheus_client читает его при импорте.
+MULTIPROC_DIR = 'PROMETHEUS_MULTIPROC_DIR'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTERS = (
+    ('requests_total', 'Обработано запросов'),
+    ('db_queries_total', 'SQL-запросов'),
+    ('db_seconds_total', 'Время в SQL, с'),
+    ('serializer_seconds_total', 'Время сериализации, с'),
+    ('response_bytes_total', 'Отдано байт'),
+    ('query_budget_exceeded_total', 'Запросов сверх бюджета SQL'),
+)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; лежат в request.metrics."""
+
+    def __init__(self):
+        self.endpoint = None
+        self.started = None
+        self.queries = 0
+        self.db_time = 0
+        self.serializer_time = 0
+        self.serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+class Registry:
+    """Метрики в формате Prometheus, общие для всех воркеров.
+
+    С PROMETHEUS_MULTIPROC_DIR (его задаёт gunicorn.conf.py) каждый
+    процесс пишет значения в свои файлы в этом каталоге, а /metrics/
+    складывает файлы всех воркеров, какой бы из них ни ответил. Без
+    каталога (runserver, тесты) отдаются метрики текущего процесса.
+    """
+
+    def __init__(self):
+        self.registry = CollectorRegistry(auto_describe=True)
+        self.counters = {
+            name: Counter(f'foodgram_{name}', help_text, ['endpoint'],
+                          registry=self.registry)
+            for name, help_text in COUNTERS
+        }
+        self.durations = Histogram(
+            'foodgram_request_duration_seconds', 'Время ответа, с',
+            ['endpoint'], buckets=BUCKETS, registry=self.registry)
+
+    def observe(self, endpoint, metrics, duration, size, over_budget):
+        for name, value in (
+            ('requests_total', 1),
+            ('db_queries_total', metrics.queries),
+            ('db_seconds_total', metrics.db_time),
+            ('serializer_seconds_total', metrics.serializer_time),
+            ('response_bytes_total', size),
+            ('query_budget_exceeded_total', over_budget),
+        ):
+            self.counters[name].labels(endpoint).inc(value)
+        self.durations.labels(endpoint).observe(duration)
+
+    def render(self):
+        registry = self.registry
+        if os.environ.get(MULTIPROC_DIR):
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+        return generate_latest(registry)
+
+
+registry = Registry()
+# Метрики текущего запроса. В отличие от соединений, контекст переходит
+# и в поток, где async-представления выполняют ORM.
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(on_connection_created)
+
+
+def view_endpoint(request, view_func):
+    """'RecipeViewSet.list' для вьюсетов DRF, имя маршрута для остальных."""
+    view_class = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if view_class is not None and actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{view_class.__name__}.{action}'
+    if view_class is not None:
+        return view_class.__name__
+    return request.resolver_match.view_name
+
+
+def query_budget(endpoint, authenticated):
+    """Бюджет SQL-запросов действия или None, если он не задан."""
+    budgets = settings.QUERY_BUDGETS.get(endpoint)
+    return None if budgets is None else budgets[authenticated]
+
+
+def is_authenticated(request):
+    """Есть ли в запросе токен: его проверка - отдельный SELECT."""
+    return 'HTTP_AUTHORIZATION' in request.META
+
+
+class MetricsMiddleware:
+    """Число и время SQL-запросов, время сериализации и размер ответа.
+
+    Метрики копятся по действиям вьюсетов, отдаются заголовком
+    Server-Timing и на /metrics/. Если задан бюджет запросов для
+    действия, превышение пишется в лог и в счётчик; соблюдение
+    бюджетов проверяют тесты (api/tests/test_query_budgets.py).
+    Потоковые ответы учитываются, когда отдан последний кусок: запросы
+    при их чтении тоже попадают в метрики.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response)
+
+    def start(self, request):
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        metrics = RequestMetrics()
+        metrics.started = time.perf_counter()
+        request.metrics = metrics
+        return current_metrics.set(metrics)
+
+    def finish(self, request, response):
+        metrics = request.metrics
+        match = request.resolver_match
+        metrics.endpoint = (view_endpoint(request, match.func) if match
+                            else 'unknown')
+        if settings.SERVER_TIMING:
+            # У потокового ответа - то, что набралось до первого куска.
+            duration = time.perf_counter() - metrics.started
+            response['Server-Timing'] = (
+                f'db;dur={metrics.db_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries", '
+                f'serializer;dur={metrics.serializer_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        if not response.streaming:
+            self.observe(request, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.acount_stream(
+                request, response.streaming_content)
+        else:
+            response.streaming_content = self.count_stream(
+                request, response.streaming_content)
+        return response
+
+    def count_stream(self, request, chunks):
+        """Отдаёт chunks, считая запросы и байты; итог - после последнего.
+
+        Метрики ставятся в контекст только на время получения куска:
+        между кусками генератор приостановлен в коде сервера.
+        """
+        chunks, size = iter(chunks), 0
+        try:
+            while True:
+                token = current_metrics.set(request.metrics)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    current_metrics.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(request, size)
+
+    async def acount_stream(self, request, chunks):
+        """count_stream для async-итератора."""
+        # aiter() и anext() есть только с Python 3.10.
+        chunks, size = chunks.__aiter__(), 0
+        try:
+            while True:
+                token = current_metrics.set(request.metrics)
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    current_metrics.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(request, size)
+
+    def observe(self, request, size):
+        metrics = request.metrics
+        duration = time.perf_counter() - metrics.started
+        endpoint = metrics.endpoint
+        budget = query_budget(endpoint, is_authenticated(request))
+        over_budget = budget is not None and metrics.queries > budget
+        registry.observe(endpoint, metrics, duration, size, over_budget)
+        if over_budget:
+            logger.warning('%s: %s SQL-запросов при бюджете %s',
+                           endpoint, metrics.queries, budget)
+
+
+class TimedSerializerMixin:
+    """Учитывает время to_representation в метриках запроса.
+
+    Вложенные сериализаторы не считаются повторно: время пишет только
+    самый внешний вызов.
+    """
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return super().to_representation(instance)
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - started
+
+
+def metrics_view(request):
+    """Метрики для Prometheus, только с токеном METRICS_TOKEN.
+
+    Без настроенного токена эндпоинта как будто нет.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE_LATEST)
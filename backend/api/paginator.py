@@ -1,7 +1,129 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from binascii import Error as DecodeError
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class FoodgramPafination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 50
     page_size = 10
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset для async-представлений.
+
+        COUNT(*) и выборка страницы идут через async ORM, остальное
+        (номер страницы, ссылки, ошибки) - как в синхронном варианте.
+        """
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * page_size
+        objects = [obj async for obj in queryset[bottom:bottom + page_size]]
+        self.page = Page(objects, number, paginator)
+        self.request = request
+        return objects
+
+
+class FoodgramCursorPagination(BasePagination):
+    """Keyset-пагинация по (created, id) без OFFSET и COUNT(*).
+
+    Курсор хранит created и id последнего рецепта страницы, следующая
+    страница выбирается условием (created, id) < (курсор) по индексу.
+    Параметры из ordering_query_params задают свой порядок, курсор по
+    дате его бы молча отбросил, поэтому с ними ответ - 400.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 50
+    page_size = 10
+    invalid_cursor_message = 'Invalid cursor'
+    ordering_query_params = ('ordering', 'search')
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created, pk = b64decode(encoded.encode()).decode().split(',')
+            created, pk = parse_datetime(created), int(pk)
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created, pk
+
+    def encode_cursor(self, obj):
+        return b64encode(
+            f'{obj.created.isoformat()},{obj.pk}'.encode()).decode()
+
+    @staticmethod
+    def before(cursor):
+        """Условие (created, id) < cursor."""
+        created, pk = cursor
+        return Q(created__lt=created) | Q(created=created, id__lt=pk)
+
+    def set_page(self, request, page, page_size):
+        """page_size + 1 объект в page означает, что есть следующая."""
+        self.request = request
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def check_ordering(self, request):
+        params = [param for param in self.ordering_query_params
+                  if request.query_params.get(param, '').strip()]
+        if params:
+            raise ValidationError({
+                param: ['Не поддерживается с pagination=cursor']
+                for param in params
+            })
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.check_ordering(request)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-created', '-id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.before(cursor))
+        return self.set_page(request, list(queryset[:page_size + 1]),
+                             page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,98 @@
+"""Список покупок в PDF на reportlab.
+
+reportlab сам встраивает в документ только использованные глифы
+шрифта, поэтому PDF весит килобайты, а не как весь TrueType-файл.
+Документ собирается в памяти целиком и отдаётся кусками.
+"""
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.exceptions import APIException
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 50
+FONT_SIZE = 12
+LEADING = 18
+TITLE_SIZE = 16
+TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+# Чем заменяются символы, которых нет в шрифте.
+MISSING_GLYPH = '?'
+CHUNK_SIZE = 64 * 1024
+
+
+class FontUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Выгрузка в PDF недоступна: не найден шрифт.'
+    default_code = 'font_unavailable'
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    """Регистрирует TrueType-шрифт в reportlab один раз на процесс.
+
+    Ошибка не кэшируется: когда шрифт появится, выгрузка заработает
+    без перезапуска.
+    """
+    try:
+        font = TTFont(f'ShoppingList:{path}', path)
+    except (OSError, TTFError) as error:
+        raise FontUnavailable() from error
+    pdfmetrics.registerFont(font)
+    return font
+
+
+def printable(font, text):
+    """Текст, где символы без глифа в шрифте заменены на MISSING_GLYPH."""
+    glyphs = font.face.charToGlyph
+    return ''.join(
+        char if ord(char) in glyphs else MISSING_GLYPH for char in text)
+
+
+def wrap(font, text, size):
+    """Переносит строку по словам, слишком длинные слова - по символам."""
+    for line in simpleSplit(text, font.fontName, size, TEXT_WIDTH) or ['']:
+        part = ''
+        for char in line:
+            if (part and pdfmetrics.stringWidth(
+                    part + char, font.fontName, size) > TEXT_WIDTH):
+                yield part
+                part = ''
+            part += char
+        yield part
+
+
+def build_pdf(font, lines, title=None):
+    buffer = BytesIO()
+    canvas = Canvas(buffer, pagesize=A4, pageCompression=1)
+    if title:
+        canvas.setTitle(title)
+    y = PAGE_HEIGHT - MARGIN
+
+    def draw(text, size):
+        nonlocal y
+        for part in wrap(font, printable(font, text), size):
+            if y - size < MARGIN:
+                canvas.showPage()
+                y = PAGE_HEIGHT - MARGIN
+            canvas.setFont(font.fontName, size)
+            canvas.drawString(MARGIN, y - size, part)
+            y -= LEADING
+
+    if title:
+        draw(title, TITLE_SIZE)
+        y -= LEADING
+    for line in lines:
+        draw(line, FONT_SIZE)
+    canvas.save()
+    return buffer.getvalue()
+
+
+def stream_pdf(font, lines, title=None):
+    document = build_pdf(font, lines, title)
+    for start in range(0, len(document), CHUNK_SIZE):
+        yield document[start:start + CHUNK_SIZE]
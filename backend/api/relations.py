@@ -0,0 +1,44 @@
+from django.utils.functional import cached_property
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscribe
+
+
+class UserRelations:
+    """Подписки, избранное и корзина пользователя запроса.
+
+    Каждое множество загружается одним запросом при первом обращении
+    и дальше живёт до конца запроса, так что сериализаторы списков не
+    ходят в базу за флагами каждого объекта.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def ids(self, model, field):
+        if self.user is None or self.user.is_anonymous:
+            return frozenset()
+        return frozenset(model.objects.filter(
+            user=self.user).values_list(field, flat=True))
+
+    @cached_property
+    def subscriptions(self):
+        return self.ids(Subscribe, 'author_id')
+
+    @cached_property
+    def favorites(self):
+        return self.ids(FavoriteRecipe, 'recipe_id')
+
+    @cached_property
+    def cart(self):
+        return self.ids(ShoppingCart, 'recipe_id')
+
+
+def get_relations(context):
+    """Связи пользователя, общие для всех сериализаторов запроса."""
+
+    request = context.get('request')
+    if request is None:
+        return UserRelations(None)
+    if not hasattr(request, '_user_relations'):
+        request._user_relations = UserRelations(request.user)
+    return request._user_relations
@@ -0,0 +1,77 @@
+import csv
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from .pdf import load_font, stream_pdf
+
+SHOPPING_LIST_TITLE = 'Список покупок'
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Наследники реализуют stream(rows), где rows - итератор кортежей
+    (название, единица измерения, количество). Новый формат подключается
+    добавлением рендерера в SHOPPING_LIST_RENDERERS.
+    """
+
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data or '').encode('utf-8')
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+    @staticmethod
+    def line(row):
+        name, measurement_point, amount = row
+        return f'{name} ({measurement_point}) — {amount}'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield '\ufeff'.encode(self.charset)
+        for row in rows:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class TXTShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_LIST_TITLE}\n\n'.encode(self.charset)
+        for row in rows:
+            yield f'{self.line(row)}\n'.encode(self.charset)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+
+    def stream(self, rows):
+        # Шрифт загружается до начала ответа: без него клиент получит
+        # 503 (FontUnavailable), а не оборванный файл.
+        font = load_font(settings.SHOPPING_LIST_FONT)
+        return stream_pdf(font, (self.line(row) for row in rows),
+                          title=SHOPPING_LIST_TITLE)
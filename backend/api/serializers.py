@@ -1,17 +1,27 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
 from django.contrib.auth.hashers import check_password
-from django.core.files.base import ContentFile
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db import transaction
 from djoser.serializers import (PasswordSerializer,
                                 UserCreateSerializer, UserSerializer)
 from rest_framework import serializers
+from recipes.images import release_image, schedule_variants
+from recipes.search import update_search
 from recipes.models import (Ingredient, IngredientAmount,
-                            Recipe, Tag, FavoriteRecipe)
+                            Recipe, RecipeScore, Tag)
 from users.models import User, Subscribe
+from .feed import invalidate_feeds
+from .metrics import TimedSerializerMixin
+from .relations import get_relations
+from .utils import bump_cart_version, change_counter
 
 
-class UserListSerializer(UserSerializer):
+class UserListSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -20,11 +30,9 @@ class UserListSerializer(UserSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        return (self.context.get('request').user.is_authenticated
-                and Subscribe.objects.filter(
-                    user=self.context.get('request').user,
-                    author=obj).exists()
-                )
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.pk in get_relations(self.context).subscriptions
 
 
 class UserCreationSerializer(UserCreateSerializer):
@@ -34,13 +42,14 @@ class UserCreationSerializer(UserCreateSerializer):
                   'first_name', 'last_name', 'password')
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = '__all__'
@@ -64,45 +73,79 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    chunk_size = 64 * 1024
+
+    def decode(self, imgstr, name):
+        """Декодирует base64 частями во временный файл."""
+        if len(imgstr) // 4 * 3 > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Размер изображения больше '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE} байт')
+        buffer = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(0, len(imgstr), self.chunk_size):
+                buffer.write(base64.b64decode(
+                    imgstr[start:start + self.chunk_size], validate=True))
+        except binascii.Error:
+            buffer.close()
+            raise serializers.ValidationError('Некорректный base64')
+        buffer.seek(0)
+        return File(buffer, name=name)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(imgstr, 'temp.' + ext)
         return super().to_internal_value(data)
 
 
-class RecipesSerializer(serializers.ModelSerializer):
+class RecipesSerializer(TimedSerializerMixin,
+                        serializers.ModelSerializer):
     image = Base64ImageField(required=True)
     tags = TagSerializer(many=True)
     ingredients = IngredientAmountSerializer(many=True)
     author = UserListSerializer(required=True)
     is_in_favorite = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_in_favorite',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_srcset',
+                  'text', 'cooking_time')
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def get_image_srcset(self, obj):
+        """srcset для каждого готового формата: 'url 320w, url 640w'."""
+        request = self.context.get('request')
+        srcset = {}
+        for image_format, widths in obj.image_variants.items():
+            sources = []
+            for width, path in sorted(widths.items(),
+                                      key=lambda item: int(item[0])):
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                sources.append(f'{url} {width}w')
+            srcset[image_format] = ', '.join(sources)
+        return srcset
 
     def get_is_in_favorite(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return FavoriteRecipe.objects.filter(
-            user=user,
-            recipe=obj
-        ).exists()
+        if hasattr(obj, 'is_in_favorite'):
+            return obj.is_in_favorite
+        return obj.pk in get_relations(self.context).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Recipe.objects.filter(
-            shopping_cart__user=user,
-            id=obj.id
-        ).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.pk in get_relations(self.context).cart
 
 
 class SubscribeRecipeSerializer(RecipesSerializer):
@@ -115,7 +158,8 @@ class SubscribeRecipeSerializer(RecipesSerializer):
 class RecipeEditSerializer(RecipesSerializer):
     image = Base64ImageField(max_length=None, use_url=True)
     ingredients = IngredientPatchCreateSerializer(many=True)
-    tags = serializers.ListField(write_only=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), write_only=True)
     author = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
@@ -123,34 +167,119 @@ class RecipeEditSerializer(RecipesSerializer):
         fields = ('ingredients', 'tags', 'image',
                   'name', 'text', 'cooking_time')
 
-    def validate(self, data):
-        ingredients = data.get('ingredients')
-        tags = data.get('tags')
+    def lookup(self, model, ids):
+        """Объекты по id; при массовой загрузке - из общего словаря."""
+        preloaded = self.context.get('preloaded')
+        if preloaded is not None:
+            return preloaded[model]
+        return model.objects.in_bulk(ids)
+
+    def validate_tag_ids(self, tags):
         if not tags:
-            raise serializers.ValidationError('Добавьте тег')
-        ingredients_list = []
+            return ['Добавьте тег']
+        self.tag_objects = self.lookup(Tag, tags)
+        errors, seen = {}, set()
+        for index, tag in enumerate(tags):
+            if tag not in self.tag_objects:
+                errors[index] = [f'Тег {tag} не найден']
+            elif tag in seen:
+                errors[index] = ['Теги повторяются']
+            seen.add(tag)
+        return errors
+
+    def validate_ingredient_items(self, ingredients):
+        if not ingredients:
+            return ['Должен быть хотя бы один ингредиент']
+        self.ingredient_objects = self.lookup(
+            Ingredient, [ingredient.get('id') for ingredient in ingredients])
+        errors, seen = [], set()
         for ingredient in ingredients:
-            if ingredient.get('amount') <= 0:
-                raise serializers.ValidationError(
-                    'Количество ингредиентов должно быть больше 0')
-            ingredients_list.append(ingredient.get('id'))
-        if len(ingredients_list) != len(set(ingredients_list)):
-            raise serializers.ValidationError(
-                'Ингредиенты повторяются')
-        if not ingredients_list:
-            raise serializers.ValidationError(
-                'Должен быть хотя бы один ингредиент')
+            # При partial=True вложенный сериализатор не проверяет
+            # обязательность id и amount.
+            item_errors = {
+                field: [serializers.Field.default_error_messages['required']]
+                for field in ('id', 'amount') if ingredient.get(field) is None
+            }
+            if 'id' not in item_errors:
+                if ingredient['id'] not in self.ingredient_objects:
+                    item_errors['id'] = [
+                        f'Ингредиент {ingredient["id"]} не найден']
+                elif ingredient['id'] in seen:
+                    item_errors['id'] = ['Ингредиенты повторяются']
+            if 'amount' not in item_errors and ingredient['amount'] <= 0:
+                item_errors['amount'] = [
+                    'Количество ингредиентов должно быть больше 0']
+            seen.add(ingredient.get('id'))
+            errors.append(item_errors)
+        return errors if any(errors) else None
+
+    def validate(self, data):
+        """Проверяет все id одним запросом на таблицу до любой записи."""
+        errors = {}
+        if not self.partial or 'tags' in data:
+            tag_errors = self.validate_tag_ids(data.get('tags'))
+            if tag_errors:
+                errors['tags'] = tag_errors
+        if not self.partial or 'ingredients' in data:
+            ingredient_errors = self.validate_ingredient_items(
+                data.get('ingredients'))
+            if ingredient_errors:
+                errors['ingredients'] = ingredient_errors
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
     def add_ingredient(self, ingredients, recipe):
         amounts = [
             IngredientAmount(
                 recipe=recipe,
-                ingredient_id=ingredient.get('id'),
+                ingredient=self.ingredient_objects[ingredient.get('id')],
                 amount=ingredient.get('amount')
             ) for ingredient in ingredients
         ]
-        IngredientAmount.objects.bulk_create(amounts)
+        return IngredientAmount.objects.bulk_create(amounts)
+
+    def update_ingredients(self, ingredients, recipe):
+        """Сверяет ингредиенты с текущими и меняет только разницу.
+
+        Возвращает итоговый список количеств и признак того, что состав
+        рецепта изменился.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in recipe.ingredients.all()
+        }
+        new, changed, kept = [], [], []
+        for ingredient in ingredients:
+            amount = current.pop(ingredient.get('id'), None)
+            if amount is None:
+                new.append(ingredient)
+                continue
+            if amount.amount != ingredient.get('amount'):
+                amount.amount = ingredient.get('amount')
+                changed.append(amount)
+            amount.ingredient = self.ingredient_objects[amount.ingredient_id]
+            kept.append(amount)
+        if current:
+            IngredientAmount.objects.filter(
+                id__in=[amount.id for amount in current.values()]
+            ).delete()
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ('amount',))
+        if new:
+            kept += self.add_ingredient(new, recipe)
+        return kept, bool(current or changed or new)
+
+    def remember_relations(self, amounts=None, tags=None):
+        """Запоминает связи, чтобы ответ не перечитывал их из базы."""
+        if amounts is not None:
+            self.saved_amounts = sorted(
+                amounts, key=lambda amount: amount.id or 0)
+        if tags is not None:
+            self.saved_tags = sorted(
+                (self.tag_objects[tag] for tag in set(tags)),
+                key=lambda tag: tag.name
+            )
 
     @transaction.atomic
     def create(self, validated_data):
@@ -159,21 +288,57 @@ class RecipeEditSerializer(RecipesSerializer):
         tags = validated_data.pop('tags')
         author = request.user
         recipe = Recipe.objects.create(author=author, **validated_data)
+        RecipeScore.objects.create(recipe=recipe)
+        transaction.on_commit(lambda: invalidate_feeds([author.pk]))
+        schedule_variants(recipe)
+        change_counter(User, author.pk, 'recipes_count', 1)
         recipe.tags.add(*tags)
-        self.add_ingredient(ingredients, recipe)
+        self.remember_relations(self.add_ingredient(ingredients, recipe), tags)
+        update_search([recipe.pk])
+        recipe.is_in_favorite = False
+        recipe.is_in_shopping_cart = False
+        recipe.author_is_subscribed = False
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.add(*tags)
-        IngredientAmount.objects.filter(recipe_id=instance.pk).delete()
-        self.add_ingredient(ingredients, instance)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            amounts, changed = self.update_ingredients(ingredients, instance)
+            if changed:
+                bump_cart_version(
+                    User.objects.filter(shopping_cart__recipe=instance))
+            self.remember_relations(amounts)
+        else:
+            self.saved_amounts = list(instance.ingredients.all())
+        if tags is not None:
+            self.remember_relations(tags=tags)
+        else:
+            self.saved_tags = list(instance.tags.all())
+        old_image = instance.image.name, instance.image_variants
         super().update(instance, validated_data)
+        update_search([instance.pk])
+        if instance.image.name != old_image[0]:
+            instance.image_variants = {}
+            instance.save(update_fields=('image_variants',))
+            release_image(*old_image)
+            schedule_variants(instance)
         return instance
 
+    def to_representation(self, instance):
+        cache = getattr(instance, '_prefetched_objects_cache', {})
+        for related, objects in (('ingredients', self.saved_amounts),
+                                 ('tags', self.saved_tags)):
+            queryset = getattr(instance, related).all()
+            queryset._result_cache = objects
+            queryset._prefetch_done = True
+            cache[related] = queryset
+        instance._prefetched_objects_cache = cache
+        return representation(self.context, instance, RecipesSerializer)
+
 
 class SetPasswordSerializer(PasswordSerializer):
     current_password = serializers.CharField(
@@ -192,7 +357,8 @@ class SetPasswordSerializer(PasswordSerializer):
         return super().validate(data)
 
 
-class UserSubscribeSerializer(serializers.ModelSerializer):
+class UserSubscribeSerializer(TimedSerializerMixin,
+                              serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
     username = serializers.ReadOnlyField(source='author.username')
@@ -203,27 +369,44 @@ class UserSubscribeSerializer(serializers.ModelSerializer):
     recipes_count = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=obj.author).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.author_id in get_relations(self.context).subscriptions
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if recipes_limit:
-            queryset = queryset[:int(recipes_limit)]
-        return SubscribeRecipeSerializer(queryset, many=True).data
+        # Превью с проверенным recipes_limit подгружает attach_recipes.
+        return SubscribeRecipeSerializer(
+            obj.recipe_previews, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
     class Meta:
         model = Subscribe
         fields = '__all__'
 
 
+class BulkModeSerializer(serializers.Serializer):
+    atomic = serializers.BooleanField(default=True)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_MAX_ITEMS
+    )
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+class IngredientSearchSerializer(serializers.Serializer):
+    name = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+
 def representation(context, instance, serializer):
     """Функция для использования в to_representation"""
 
@@ -0,0 +1,31 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+from .utils import bump_cart_version, change_counters
+
+
+@receiver(pre_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    """Сдвигает счётчики, которые унесёт каскадное удаление пользователя.
+
+    Срабатывает и для DELETE /api/users/me/, и для удаления в админке.
+    Избранное и корзина удаляются вместе с пользователем без вызова
+    API, поэтому счётчики чужих рецептов и подписчиков авторов
+    уменьшаются здесь. Счётчики его собственных рецептов не трогаются:
+    рецепты удаляются вместе с ним.
+    """
+    for model, counter in ((FavoriteRecipe, 'favorites_count'),
+                           (ShoppingCart, 'carts_count')):
+        change_counters(Recipe, list(model.objects.filter(
+            user=instance
+        ).exclude(recipe__author=instance).values_list(
+            'recipe_id', flat=True)), counter, -1)
+    change_counters(User, list(Subscribe.objects.filter(
+        user=instance
+    ).exclude(author=instance).values_list(
+        'author_id', flat=True)), 'followers_count', -1)
+    # Его рецепты пропадут из чужих корзин.
+    bump_cart_version(User.objects.filter(
+        shopping_cart__recipe__author=instance).exclude(pk=instance.pk))
@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+from io import BytesIO
+from itertools import count
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from recipes.models import (Ingredient, IngredientAmount, Recipe,
+                            RecipeScore, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users.models import User
+
+numbers = count()
+
+
+class FoodgramTestCase(APITestCase):
+    """Фабрики тестовых данных без загрузки картинок через API.
+
+    Загруженные в тестах файлы пишутся во временный MEDIA_ROOT.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        media = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media)
+        media_root = override_settings(MEDIA_ROOT=media)
+        media_root.enable()
+        cls.addClassCleanup(media_root.disable)
+        super().setUpClass()
+
+    @staticmethod
+    def image(size=(8, 8), image_format='PNG'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, image_format)
+        return SimpleUploadedFile(f'recipe.{image_format.lower()}',
+                                  buffer.getvalue())
+
+    @classmethod
+    def create_user(cls):
+        number = next(numbers)
+        return User.objects.create_user(
+            email=f'user{number}@example.com', username=f'user{number}',
+            first_name='Имя', last_name='Фамилия', password='password')
+
+    @classmethod
+    def create_tags(cls, total=2):
+        return [
+            Tag.objects.create(name=f'Тег {number}', color=Tag.ORANGE,
+                               slug=f'tag{number}')
+            for number in (next(numbers) for _ in range(total))
+        ]
+
+    @classmethod
+    def create_ingredients(cls, total=3):
+        return [
+            Ingredient.objects.create(name=f'Продукт {number}',
+                                      measurement_point='г')
+            for number in (next(numbers) for _ in range(total))
+        ]
+
+    @classmethod
+    def create_recipe(cls, author, tags, ingredients, name='Рецепт'):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10,
+            image='recipes/images/recipe.png')
+        RecipeScore.objects.create(recipe=recipe)
+        recipe.tags.set(tags)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient, amount=2)
+            for ingredient in ingredients)
+        User.objects.filter(pk=author.pk).update(
+            recipes_count=author.recipes.count())
+        return recipe
+
+    def tearDown(self):
+        # Кэш не откатывается вместе с базой, а id в ней могут повториться.
+        cache.clear()
+        super().tearDown()
+
+    def login(self, user):
+        token = Token.objects.get_or_create(user=user)[0]
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
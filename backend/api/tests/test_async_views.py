@@ -0,0 +1,140 @@
+import importlib
+from types import ModuleType
+
+from api.async_views import ROUTES
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscribe
+
+from .base import FoodgramTestCase
+
+
+def async_urlconf():
+    """Маршруты API, собранные заново с ASYNC_READS=True."""
+    with override_settings(ASYNC_READS=True):
+        urls = importlib.reload(importlib.import_module('api.urls'))
+        patterns = urls.urlpatterns
+    # Модуль остаётся синхронным для остальных тестов.
+    importlib.reload(urls)
+    urlconf = ModuleType('async_urls')
+    urlconf.urlpatterns = [
+        path('api/', include((patterns, 'api'), namespace='api'))]
+    return urlconf
+
+
+async def collect(chunks):
+    return b''.join([chunk async for chunk in chunks])
+
+
+def read(response):
+    if not response.streaming:
+        return response.content
+    if response.is_async:
+        return async_to_sync(collect)(response.streaming_content)
+    return b''.join(response.streaming_content)
+
+
+class AsyncViewsTest(FoodgramTestCase):
+    """Async-представления отвечают так же, как синхронные DRF."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.urlconf = async_urlconf()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, author = cls.create_user(), cls.create_user()
+        cls.tags, cls.ingredients = cls.create_tags(), cls.create_ingredients()
+        cls.recipes = [
+            cls.create_recipe(author, cls.tags, cls.ingredients)
+            for _ in range(3)
+        ]
+        FavoriteRecipe.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Subscribe.objects.create(user=cls.user, author=author)
+
+    def paths(self):
+        recipe, tag = self.recipes[0], self.tags[0]
+        return {
+            'tags/': ['/api/tags/'],
+            'ingredients/': ['/api/ingredients/',
+                             '/api/ingredients/?name=Прод&limit=2',
+                             '/api/ingredients/?limit=0'],
+            'recipes/': ['/api/recipes/', '/api/recipes/?limit=2&page=2',
+                         f'/api/recipes/?tags={tag.slug}&is_favorited=1',
+                         '/api/recipes/?ordering=popular',
+                         '/api/recipes/?search=Рецепт',
+                         '/api/recipes/?page=100',
+                         '/api/recipes/?tags=unknown'],
+            'recipes/<int:pk>/': [f'/api/recipes/{recipe.pk}/',
+                                  '/api/recipes/0/'],
+            'recipes/download_shopping_cart/': [
+                '/api/recipes/download_shopping_cart/',
+                '/api/recipes/download_shopping_cart/?format=txt'],
+        }
+
+    def setUp(self):
+        # AsyncClient не знает о credentials() клиента DRF.
+        self.token = {}
+
+    def login(self, user):
+        super().login(user)
+        self.token = {'Authorization': f'Token {user.auth_token.key}'}
+
+    def get(self, path, asynchronous, **headers):
+        """Ответ, его тело и число SQL-запросов."""
+        headers.update(self.token)
+        # Метки версий и кэш списка покупок создаются первым запросом
+        # и не входят в счёт.
+        read(self.client.get(path))
+        with CaptureQueriesContext(connection) as queries:
+            if asynchronous:
+                with override_settings(ROOT_URLCONF=self.urlconf):
+                    response = async_to_sync(self.async_client.get)(
+                        path, headers=headers)
+            else:
+                response = self.client.get(path, headers=headers)
+            body = read(response)
+        return response, body, len(queries)
+
+    def compare(self, path, **headers):
+        sync, sync_body, sync_queries = self.get(path, False, **headers)
+        response, body, queries = self.get(path, True, **headers)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(body, sync_body)
+        self.assertEqual(queries, sync_queries)
+        for header in ('Content-Type', 'ETag', 'Last-Modified', 'Vary',
+                       'Content-Disposition'):
+            self.assertEqual(response.get(header), sync.get(header), header)
+        return response
+
+    def check_routes(self):
+        paths = self.paths()
+        self.assertEqual(set(paths), {route for route, _, _ in ROUTES})
+        for route_paths in paths.values():
+            for url in route_paths:
+                with self.subTest(url=url):
+                    response = self.compare(url)
+                    if response.has_header('ETag'):
+                        self.assertEqual(self.compare(
+                            url, If_None_Match=response['ETag']
+                        ).status_code, 304)
+
+    def test_anonymous(self):
+        self.check_routes()
+
+    def test_authenticated(self):
+        self.login(self.user)
+        self.check_routes()
+
+    def test_async_views_serve(self):
+        # Основной сценарий обслуживает async-представление, а не DRF.
+        for url in ('/api/tags/', '/api/recipes/',
+                    f'/api/recipes/{self.recipes[0].pk}/'):
+            with self.subTest(url=url):
+                self.assertFalse(hasattr(self.get(url, True)[0], 'data'))
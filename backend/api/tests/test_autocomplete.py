@@ -0,0 +1,46 @@
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient
+
+from .base import FoodgramTestCase
+
+URL = '/api/ingredients/'
+
+
+class IngredientAutocompleteTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('сахарная пудра', 'ванильный сахар', 'сахар',
+                     'ёлочные грибы', 'мёд', 'соль'):
+            Ingredient.objects.create(name=name, measurement_point='г')
+
+    def names(self, query):
+        response = self.client.get(URL, {'name': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_prefix_before_substring(self):
+        self.assertEqual(self.names('сахар'),
+                         ['сахар', 'сахарная пудра', 'ванильный сахар'])
+
+    def test_yo_folding(self):
+        self.assertEqual(self.names('елоч'), ['ёлочные грибы'])
+        self.assertEqual(self.names('МЕД'), ['мёд'])
+
+    def test_limit(self):
+        response = self.client.get(URL, {'name': 'сахар', 'limit': 2})
+        self.assertEqual([item['name'] for item in response.json()],
+                         ['сахар', 'сахарная пудра'])
+        for limit in ('0', '-1', 'abc'):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    URL, {'name': 'сахар', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.json())
+
+    def test_new_ingredient_is_found(self):
+        self.assertEqual(self.names('шафран'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='шафран', measurement_point='г')
+            ingredient_index.invalidate()
+        self.assertEqual(self.names('шафр'), ['шафран'])
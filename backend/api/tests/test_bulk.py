@@ -0,0 +1,57 @@
+from recipes.models import Recipe
+
+from .base import FoodgramTestCase
+
+URL = '/api/recipes/bulk/'
+
+
+class BulkUpdateTest(FoodgramTestCase):
+    """Ошибочный элемент пачки не роняет её целиком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user()
+        tags, cls.ingredients = cls.create_tags(), cls.create_ingredients()
+        cls.recipes = [cls.create_recipe(cls.author, tags, cls.ingredients)
+                       for _ in range(2)]
+
+    def setUp(self):
+        self.login(self.author)
+        self.items = [
+            {'id': self.recipes[0].pk, 'name': 'Новое название'},
+            {'id': self.recipes[1].pk,
+             'ingredients': [{'id': self.ingredients[0].pk}]},
+        ]
+
+    def names(self):
+        return list(Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in self.recipes]
+        ).order_by('pk').values_list('name', flat=True))
+
+    def test_atomic(self):
+        response = self.client.patch(URL, self.items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['index'] for result in response.data], [1])
+        self.assertIn('amount',
+                      response.data[0]['errors']['ingredients'][0])
+        self.assertEqual(self.names(), ['Рецепт', 'Рецепт'])
+
+    def test_not_atomic(self):
+        response = self.client.patch(f'{URL}?atomic=false', self.items,
+                                     format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data],
+                         [200, 400])
+        self.assertEqual(self.names(), ['Новое название', 'Рецепт'])
+
+    def test_duplicate_id(self):
+        self.items[1] = {'id': self.recipes[0].pk, 'name': 'Другое название'}
+        for url in (URL, f'{URL}?atomic=false'):
+            with self.subTest(url=url):
+                response = self.client.patch(url, self.items, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    [(result['index'], result['status'])
+                     for result in response.data], [(0, 400), (1, 400)])
+                self.assertIn('id', response.data[0]['errors'])
+        self.assertEqual(self.names(), ['Рецепт', 'Рецепт'])
@@ -0,0 +1,147 @@
+from django.contrib.admin.sites import site
+from django.db.models import F
+from django.test import RequestFactory
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+from .base import FoodgramTestCase
+
+
+class CountersTest(FoodgramTestCase):
+    """Полное сохранение не откатывает счётчики, изменённые через F()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.recipe = cls.create_recipe(
+            cls.user, cls.create_tags(), cls.create_ingredients())
+
+    def test_recipe_update_keeps_favorites_count(self):
+        # Параллельный запрос добавил рецепт в избранное после чтения.
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            favorites_count=F('favorites_count') + 1)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=F('favorites_count') + 1)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 2)
+
+    def test_profile_update_keeps_user_counters(self):
+        self.login(self.user)
+        User.objects.filter(pk=self.user.pk).update(
+            followers_count=F('followers_count') + 1,
+            cart_version=F('cart_version') + 1)
+        response = self.client.patch('/api/users/me/',
+                                     {'first_name': 'Другое'})
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Другое')
+        self.assertEqual(user.followers_count, 1)
+        self.assertEqual(user.cart_version, 1)
+        self.assertEqual(user.recipes_count, 1)
+
+    def test_add_many_counts_only_new_rows(self):
+        other = self.create_recipe(
+            self.user, self.create_tags(1), self.create_ingredients(1))
+        self.login(self.user)
+        self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        response = self.client.post(
+            '/api/recipes/favorite/', [self.recipe.pk, other.pk],
+            format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(Recipe.objects.filter(pk__in=[self.recipe.pk, other.pk])
+                 .order_by('pk').values_list('favorites_count', flat=True)),
+            [1, 1])
+
+
+class CountersOutsideApiTest(FoodgramTestCase):
+    """Счётчики верны после удаления пользователя и правок в админке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user = cls.create_user(), cls.create_user()
+        cls.tags, cls.ingredients = cls.create_tags(), cls.create_ingredients()
+        cls.recipe = cls.create_recipe(cls.author, cls.tags, cls.ingredients)
+
+    def setUp(self):
+        self.request = RequestFactory().post('/admin/')
+        self.request.user = self.author
+
+    def assert_counters(self, favorites, carts, followers):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.carts_count,
+             author.followers_count),
+            (favorites, carts, followers))
+        self.assertEqual(
+            (favorites, carts, followers),
+            (FavoriteRecipe.objects.filter(recipe=recipe).count(),
+             ShoppingCart.objects.filter(recipe=recipe).count(),
+             Subscribe.objects.filter(author=author).count()))
+
+    def relate(self, user):
+        self.login(user)
+        for path in (f'/api/recipes/{self.recipe.pk}/favorite/',
+                     f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+                     f'/api/users/{self.author.pk}/subscribe/'):
+            self.assertEqual(self.client.post(path).status_code, 201)
+
+    def test_user_deleted(self):
+        self.relate(self.user)
+        self.assert_counters(1, 1, 1)
+        response = self.client.delete(
+            '/api/users/me/', {'current_password': 'password'})
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters(0, 0, 0)
+
+    def test_users_deleted_in_admin(self):
+        self.relate(self.user)
+        self.relate(self.create_user())
+        self.assert_counters(2, 2, 2)
+        site._registry[User].delete_queryset(
+            self.request, User.objects.exclude(pk=self.author.pk))
+        self.assert_counters(0, 0, 0)
+
+    def test_relations_deleted_in_admin(self):
+        self.relate(self.user)
+        self.relate(self.create_user())
+        for model in (FavoriteRecipe, ShoppingCart, Subscribe):
+            site._registry[model].delete_model(
+                self.request, model.objects.filter(user=self.user).get())
+        self.assert_counters(1, 1, 1)
+        for model in (FavoriteRecipe, ShoppingCart, Subscribe):
+            site._registry[model].delete_queryset(
+                self.request, model.objects.all())
+        self.assert_counters(0, 0, 0)
+
+    def test_relation_added_in_admin(self):
+        admin = site._registry[FavoriteRecipe]
+        form = admin.get_form(self.request)(data={
+            'user': self.user.pk, 'recipe': self.recipe.pk,
+            'created_0': '2024-01-01', 'created_1': '10:00'})
+        self.assertTrue(form.is_valid(), form.errors)
+        admin.save_model(self.request, form.save(commit=False), form, False)
+        self.assert_counters(1, 0, 0)
+
+    def test_recipes_in_admin(self):
+        admin = site._registry[Recipe]
+        form = admin.get_form(self.request)(data={
+            'author': self.author.pk, 'name': 'Из админки',
+            'text': 'Описание', 'cooking_time': 5,
+            'tags': [tag.pk for tag in self.tags],
+        }, files={'image': self.image()})
+        self.assertTrue(form.is_valid(), form.errors)
+        recipe = form.save(commit=False)
+        admin.save_model(self.request, recipe, form, False)
+        form.save_m2m()
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).recipes_count, 2)
+        admin.delete_model(self.request, recipe)
+        admin.delete_queryset(self.request, Recipe.objects.all())
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).recipes_count, 0)
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from recipes.images import generate_variants
+from recipes.models import Ingredient, IngredientAmount, Tag
+from recipes.versions import INGREDIENTS, TAGS, get_version
+
+from .base import FoodgramTestCase
+
+
+class RecipeETagTest(FoodgramTestCase):
+    """ETag рецепта меняется вместе со всем, что выводится в ответе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user()
+        cls.recipe = cls.create_recipe(
+            cls.author, cls.create_tags(), cls.create_ingredients())
+
+    def etag(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assert_not_modified(self, etag):
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_image_variants(self):
+        etag = self.etag()
+        self.assert_not_modified(etag)
+        variants = {'jpeg': {320: 'recipes/images/variants/recipe_320.jpeg'}}
+        with mock.patch('recipes.images.build_variants',
+                        return_value=variants):
+            generate_variants(self.recipe.pk, self.recipe.image.name)
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_author_profile(self):
+        etag = self.etag()
+        self.login(self.author)
+        response = self.client.patch('/api/users/me/',
+                                     {'first_name': 'Другое'})
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_amount_changed_in_admin(self):
+        etag = self.etag()
+        request = RequestFactory().post('/admin/')
+        request.user = self.author
+        amount = IngredientAmount.objects.filter(recipe=self.recipe).first()
+        form = site._registry[IngredientAmount].get_form(
+            request, amount)(instance=amount, data={
+                'recipe': amount.recipe_id,
+                'ingredient': amount.ingredient_id,
+                'amount': 7,
+            })
+        self.assertTrue(form.is_valid(), form.errors)
+        site._registry[IngredientAmount].save_model(
+            request, form.save(commit=False), form, True)
+        self.assertNotEqual(self.etag(), etag)
+
+
+class ReferenceVersionTest(FoodgramTestCase):
+    """Справочники из админки меняют версию только после коммита."""
+
+    def setUp(self):
+        self.request = RequestFactory().post('/admin/')
+
+    def assert_bumped_on_commit(self, table, model, queryset):
+        version = get_version(table)
+        with self.captureOnCommitCallbacks() as callbacks:
+            site._registry[model].delete_queryset(self.request, queryset)
+        self.assertEqual(get_version(table), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_version(table), version)
+
+    def test_tags(self):
+        self.create_tags()
+        self.assert_bumped_on_commit(TAGS, Tag, Tag.objects.all())
+
+    def test_ingredients(self):
+        self.create_ingredients()
+        self.assert_bumped_on_commit(
+            INGREDIENTS, Ingredient, Ingredient.objects.all())
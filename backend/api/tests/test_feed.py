@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from recipes.models import Recipe
+from users.models import Subscribe
+
+from .base import FoodgramTestCase
+
+URL = '/api/recipes/feed/'
+
+
+class FeedTest(FoodgramTestCase):
+    """Лента сливает рецепты авторов из подписок, новые сверху."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        authors = [cls.create_user() for _ in range(4)]
+        tags, ingredients = cls.create_tags(), cls.create_ingredients()
+        now = timezone.now()
+        # Рецепты авторов чередуются по времени, у части время совпадает.
+        for number in range(12):
+            author = authors[number % len(authors)]
+            recipe = cls.create_recipe(author, tags, ingredients)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                created=now - timedelta(minutes=number // 3 * 7 % 11))
+        Subscribe.objects.bulk_create(
+            Subscribe(user=cls.user, author=author) for author in authors[:3])
+        cls.expected = list(Recipe.objects.filter(
+            author__in=authors[:3]).order_by('-created', '-id').values_list(
+            'id', flat=True))
+
+    def setUp(self):
+        self.login(self.user)
+
+    def walk(self, limit):
+        ids, url = [], f'{URL}?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_merge_order(self):
+        self.assertEqual(len(self.expected), 9)
+        for limit in (1, 2, 4, 9, 50):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(limit), self.expected)
+
+    @override_settings(RECIPE_FEED_CACHE_TIMEOUT=60)
+    def test_cached_pages(self):
+        self.assertEqual(self.walk(4), self.expected)
+        self.assertEqual(self.walk(4), self.expected)
+        author = Recipe.objects.exclude(
+            author__following__user=self.user).first().author
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.walk(4), list(Recipe.objects.exclude(
+            author=self.user).order_by('-created', '-id').values_list(
+            'id', flat=True)))
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', 'bm90LWEtZGF0ZSwx', '%%%'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(URL, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_anonymous(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(URL).status_code, 401)
@@ -0,0 +1,53 @@
+from recipes.models import FavoriteRecipe
+
+from .base import FoodgramTestCase
+
+URL = '/api/recipes/'
+
+
+class RecipeFilterTest(FoodgramTestCase):
+    """Фильтры списка рецептов сочетаются друг с другом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = (
+            cls.create_user(), cls.create_user(), cls.create_user())
+        cls.breakfast, cls.lunch, cls.dinner = cls.create_tags(3)
+        ingredients = cls.create_ingredients()
+        cls.both = cls.create_recipe(
+            cls.author, [cls.breakfast, cls.lunch], ingredients)
+        cls.dinner_recipe = cls.create_recipe(
+            cls.author, [cls.dinner], ingredients)
+        cls.not_favorite = cls.create_recipe(
+            cls.author, [cls.breakfast], ingredients)
+        cls.other_recipe = cls.create_recipe(
+            cls.other, [cls.breakfast], ingredients)
+        FavoriteRecipe.objects.bulk_create(
+            FavoriteRecipe(user=cls.user, recipe=recipe) for recipe in
+            (cls.both, cls.dinner_recipe, cls.other_recipe))
+
+    def ids(self, **params):
+        response = self.client.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def test_composition(self):
+        self.login(self.user)
+        self.assertEqual(
+            self.ids(is_favorited=1, author=self.author.pk,
+                     tags=[self.breakfast.slug, self.dinner.slug]),
+            {self.both.pk, self.dinner_recipe.pk})
+
+    def test_several_tags_do_not_duplicate(self):
+        self.assertEqual(
+            self.ids(author=self.author.pk,
+                     tags=[self.breakfast.slug, self.lunch.slug]),
+            {self.both.pk, self.not_favorite.pk})
+        response = self.client.get(URL, {
+            'tags': [self.breakfast.slug, self.lunch.slug]})
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_anonymous_is_favorited(self):
+        self.assertEqual(self.ids(is_favorited=1), set())
+        self.assertEqual(self.ids(is_in_shopping_cart=1), set())
+        self.assertEqual(len(self.ids(is_favorited=0)), 4)
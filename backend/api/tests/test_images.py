@@ -0,0 +1,59 @@
+import base64
+
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from PIL import Image
+from recipes.images import generate_variants, variant_formats
+from recipes.models import Recipe
+
+from .base import FoodgramTestCase
+
+
+class RecipeImageTest(FoodgramTestCase):
+    """Уменьшенные копии и ограничение размера загрузки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user()
+        cls.tags, cls.ingredients = cls.create_tags(), cls.create_ingredients()
+        cls.recipe = cls.create_recipe(cls.author, cls.tags, cls.ingredients)
+
+    def variants(self, size):
+        name = default_storage.save('recipes/images/photo.png',
+                                    self.image(size))
+        Recipe.objects.filter(pk=self.recipe.pk).update(image=name)
+        generate_variants(self.recipe.pk, name)
+        return Recipe.objects.get(pk=self.recipe.pk).image_variants
+
+    def test_variants(self):
+        variants = self.variants((700, 70))
+        self.assertEqual(set(variants), set(variant_formats()))
+        self.assertIn('jpeg', variants)
+        for extension, widths in variants.items():
+            # Ширина 1280 больше оригинала и не нужна.
+            self.assertEqual(set(widths), {'320', '640'})
+            for width, path in widths.items():
+                with default_storage.open(path) as f, Image.open(f) as image:
+                    self.assertEqual(image.width, int(width))
+                    self.assertEqual(image.format.lower(), extension)
+
+    def test_small_original(self):
+        variants = self.variants((100, 50))
+        self.assertEqual(set(variants['jpeg']), {'100'})
+
+    def test_upload_size_limit(self):
+        self.login(self.author)
+        image = base64.b64encode(self.image((64, 64)).read()).decode()
+        data = {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+            'image': f'data:image/png;base64,{image}',
+        }
+        with override_settings(RECIPE_IMAGE_MAX_SIZE=len(image) // 2):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertEqual(Recipe.objects.count(), 1)
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201)
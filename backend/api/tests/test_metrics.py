@@ -0,0 +1,56 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from api.metrics import MULTIPROC_DIR, registry
+from django.conf import settings
+from django.test import override_settings
+
+from .base import FoodgramTestCase
+
+URL = '/metrics/'
+# Так запрос записывает метрики в воркере gunicorn.
+OBSERVE = (
+    'import django; django.setup(); '
+    'from api.metrics import RequestMetrics, registry; '
+    'registry.observe("TagViewSet.list", RequestMetrics(), 0.01, 10, False)'
+)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(FoodgramTestCase):
+
+    def test_token_required(self):
+        self.assertEqual(self.client.get(URL).status_code, 401)
+        response = self.client.get(URL, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(
+                URL, HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 404)
+
+    def test_metrics(self):
+        self.client.get('/api/tags/')
+        response = self.client.get(URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'foodgram_requests_total{endpoint="TagViewSet.list"}',
+                      response.content)
+
+    def test_workers_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        environment = {**os.environ, MULTIPROC_DIR: directory}
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', OBSERVE], check=True,
+                           cwd=settings.BASE_DIR, env=environment)
+        with mock.patch.dict(os.environ, {MULTIPROC_DIR: directory}):
+            metrics = registry.render().decode()
+        self.assertIn(
+            'foodgram_requests_total{endpoint="TagViewSet.list"} 2.0',
+            metrics)
+        self.assertIn(
+            'foodgram_request_duration_seconds_count'
+            '{endpoint="TagViewSet.list"} 2.0', metrics)
@@ -0,0 +1,31 @@
+from .base import FoodgramTestCase
+
+URL = '/api/recipes/?pagination=cursor'
+
+
+class CursorPaginationTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author, tags = cls.create_user(), cls.create_tags()
+        ingredients = cls.create_ingredients()
+        for _ in range(3):
+            cls.create_recipe(author, tags, ingredients)
+
+    def test_pages(self):
+        response = self.client.get(f'{URL}&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_ordering_rejected(self):
+        response = self.client.get(f'{URL}&ordering=popular')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+    def test_search_rejected(self):
+        response = self.client.get(f'{URL}&search=рецепт')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
@@ -0,0 +1,70 @@
+import os
+from unittest import skipUnless
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from recipes.models import ShoppingCart
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from api.pdf import (MISSING_GLYPH, TEXT_WIDTH, build_pdf, load_font,
+                     printable, wrap)
+
+from .base import FoodgramTestCase
+
+HAS_FONT = os.path.exists(settings.SHOPPING_LIST_FONT)
+
+
+@skipUnless(HAS_FONT, 'нет шрифта SHOPPING_LIST_FONT')
+class PdfTest(SimpleTestCase):
+
+    def setUp(self):
+        self.font = load_font(settings.SHOPPING_LIST_FONT)
+
+    def test_long_lines_are_wrapped(self):
+        lines = list(wrap(self.font, 'Очень длинная строка ' * 20, 12))
+        self.assertGreater(len(lines), 1)
+        for line in lines:
+            self.assertLessEqual(
+                stringWidth(line, self.font.fontName, 12), TEXT_WIDTH)
+        lines = list(wrap(self.font, 'Ж' * 200, 12))
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(''.join(lines), 'Ж' * 200)
+
+    def test_missing_glyphs_are_replaced(self):
+        self.assertEqual(printable(self.font, 'Морковь \U0001F955'),
+                         f'Морковь {MISSING_GLYPH}')
+        document = build_pdf(self.font, ['Морковь \U0001F955'])
+        self.assertTrue(document.startswith(b'%PDF-'))
+
+    def test_only_used_glyphs_are_embedded(self):
+        document = build_pdf(self.font, ['Мука (г) — 500'] * 100,
+                             title='Список покупок')
+        self.assertLess(len(document),
+                        os.path.getsize(settings.SHOPPING_LIST_FONT) // 10)
+        self.assertTrue(document.rstrip().endswith(b'%%EOF'))
+
+
+class PdfDownloadTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        recipe = cls.create_recipe(
+            cls.user, cls.create_tags(1), cls.create_ingredients(1))
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def download(self):
+        self.login(self.user)
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/?format=pdf')
+
+    @skipUnless(HAS_FONT, 'нет шрифта SHOPPING_LIST_FONT')
+    def test_download(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF-'))
+
+    @override_settings(SHOPPING_LIST_FONT='/nonexistent/font.ttf')
+    def test_missing_font(self):
+        self.assertEqual(self.download().status_code, 503)
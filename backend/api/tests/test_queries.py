@@ -0,0 +1,63 @@
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscribe
+
+from .base import FoodgramTestCase
+
+
+class RecipeQueriesTest(FoodgramTestCase):
+    """Число SQL-запросов чтения рецептов не зависит от числа рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.author = cls.create_user()
+        cls.tags = cls.create_tags()
+        cls.ingredients = cls.create_ingredients()
+        cls.recipe = cls.add_recipes(3)[0]
+
+    @classmethod
+    def add_recipes(cls, total):
+        recipes = [
+            cls.create_recipe(cls.author, cls.tags, cls.ingredients)
+            for _ in range(total)
+        ]
+        for recipe in recipes:
+            FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscribe.objects.get_or_create(user=cls.user, author=cls.author)
+        return recipes
+
+    def assert_queries(self, queries, path):
+        # Первый запрос прогревает метки версий справочников в кэше.
+        self.client.get(path)
+        with self.assertNumQueries(queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_anonymous(self):
+        self.assert_queries(4, '/api/recipes/')
+        self.add_recipes(5)
+        self.assert_queries(4, '/api/recipes/')
+
+    def test_list_authenticated(self):
+        self.login(self.user)
+        response = self.assert_queries(5, '/api/recipes/')
+        self.assertTrue(all(
+            recipe['is_in_favorite'] and recipe['is_in_shopping_cart']
+            and recipe['author']['is_subscribed']
+            for recipe in response.json()['results']
+        ))
+        self.add_recipes(5)
+        self.assert_queries(5, '/api/recipes/')
+
+    def test_detail_anonymous(self):
+        self.assert_queries(4, f'/api/recipes/{self.recipe.pk}/')
+
+    def test_detail_authenticated(self):
+        self.login(self.user)
+        response = self.assert_queries(
+            5, f'/api/recipes/{self.recipe.pk}/')
+        data = response.json()
+        self.assertTrue(data['is_in_favorite'])
+        self.assertTrue(data['author']['is_subscribed'])
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import FavoriteRecipe, ShoppingCart
+from recipes.search import recipe_index
+from users.models import Subscribe
+
+from .base import FoodgramTestCase
+
+
+class QueryBudgetsTest(FoodgramTestCase):
+    """Горячие эндпоинты укладываются в QUERY_BUDGETS.
+
+    Счёт берётся из MetricsMiddleware, поэтому проверяются и метки
+    действий, и запросы при чтении потоковых ответов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, author = cls.create_user(), cls.create_user()
+        cls.tags, cls.ingredients = cls.create_tags(), cls.create_ingredients()
+        cls.recipes = [
+            cls.create_recipe(author, cls.tags, cls.ingredients)
+            for _ in range(3)
+        ]
+        for recipe in cls.recipes:
+            FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscribe.objects.create(user=cls.user, author=author)
+
+    def paths(self):
+        recipe, tag = self.recipes[0], self.tags[0]
+        return [
+            '/api/tags/',
+            f'/api/tags/{tag.pk}/',
+            '/api/ingredients/',
+            '/api/ingredients/?name=Прод',
+            f'/api/ingredients/{self.ingredients[0].pk}/',
+            '/api/recipes/',
+            f'/api/recipes/?search=Рецепт&tags={tag.slug}',
+            '/api/recipes/?ordering=popular',
+            '/api/recipes/?is_favorited=1&is_in_shopping_cart=1',
+            '/api/recipes/?pagination=cursor',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/recipes/feed/',
+            '/api/recipes/download_shopping_cart/?format=txt',
+            '/api/recipes/download_shopping_cart/?format=pdf',
+            '/api/users/',
+            '/api/users/me/',
+            '/api/users/subscriptions/?recipes_limit=2',
+        ]
+
+    def queries(self, response):
+        if response.streaming:
+            b''.join(response.streaming_content)
+        metrics = response.wsgi_request.metrics
+        return metrics.endpoint, metrics.queries
+
+    def assert_budget(self, response, authenticated):
+        endpoint, queries = self.queries(response)
+        self.assertIn(endpoint, settings.QUERY_BUDGETS)
+        self.assertLessEqual(
+            queries, settings.QUERY_BUDGETS[endpoint][authenticated],
+            f'{endpoint}: {response.wsgi_request.get_full_path()}')
+
+    def check_paths(self, authenticated):
+        for path in self.paths():
+            with self.subTest(path=path):
+                # Холодный кэш: индекс поиска и списки покупок строятся
+                # заново, метки версий создаются впервые.
+                cache.clear()
+                recipe_index.invalidate()
+                self.assert_budget(self.client.get(path), authenticated)
+
+    def test_anonymous(self):
+        self.check_paths(False)
+
+    def test_authenticated(self):
+        self.login(self.user)
+        self.check_paths(True)
+        self.assert_budget(
+            self.client.patch('/api/users/me/', {'first_name': 'Другое'}),
+            True)
+
+    def test_streaming_queries_are_counted(self):
+        # Синхронная выгрузка читает корзину при отдаче тела, async -
+        # до ответа; в метриках должны быть все запросы.
+        self.login(self.user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/?format=txt')
+            endpoint, counted = self.queries(response)
+        self.assertEqual(counted, len(queries))
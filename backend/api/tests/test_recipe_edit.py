@@ -0,0 +1,79 @@
+from recipes.search import uses_postgresql
+
+from .base import FoodgramTestCase
+
+# Токен, рецепт, теги, количества и UPDATE рецепта в точке сохранения.
+NAME_QUERIES = 4 + 3
+# Плюс проверка продуктов, одна правка количеств и сброс списков покупок.
+INGREDIENT_QUERIES = NAME_QUERIES + 3
+# На PostgreSQL поисковый вектор пересчитывается отдельным UPDATE.
+SEARCH_QUERIES = 1 if uses_postgresql() else 0
+
+
+class RecipeEditTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user()
+        cls.ingredients = cls.create_ingredients(2)
+        cls.recipe = cls.create_recipe(
+            cls.author, cls.create_tags(), cls.ingredients)
+
+    def setUp(self):
+        self.login(self.author)
+
+    def test_patch_ingredient_without_amount(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {'ingredients': [{'id': self.ingredients[0].pk},
+                             {'amount': 3}]},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [set(errors) for errors in response.data['ingredients']],
+            [{'amount'}, {'id'}])
+        self.assertEqual(self.recipe.ingredients.first().amount, 2)
+
+
+class RecipeEditQueriesTest(FoodgramTestCase):
+    """Число запросов PATCH не зависит от числа продуктов в рецепте."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user()
+        cls.tags = cls.create_tags()
+
+    def setUp(self):
+        self.login(self.author)
+
+    def patch(self, recipe, data, queries):
+        with self.assertNumQueries(queries + SEARCH_QUERIES):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def check(self, total):
+        ingredients = self.create_ingredients(total + 1)
+        recipe = self.create_recipe(
+            self.author, self.tags, ingredients[:total])
+
+        def amounts(changed):
+            return [{'id': ingredient.pk, 'amount': changed.get(number, 2)}
+                    for number, ingredient in enumerate(ingredients)]
+
+        self.patch(recipe, {'name': 'Другое'}, NAME_QUERIES)
+        self.patch(recipe, {'ingredients': amounts({})},
+                   INGREDIENT_QUERIES)
+        self.patch(recipe, {'ingredients': amounts({0: 5})},
+                   INGREDIENT_QUERIES)
+        self.patch(recipe, {'ingredients': amounts({0: 5})[:-1]},
+                   INGREDIENT_QUERIES)
+        self.assertEqual(
+            sorted(recipe.ingredients.values_list('amount', flat=True)),
+            [2] * (total - 1) + [5])
+
+    def test_few_ingredients(self):
+        self.check(2)
+
+    def test_many_ingredients(self):
+        self.check(10)
@@ -0,0 +1,46 @@
+from users.models import User
+
+from .base import FoodgramTestCase
+
+URL = '/api/users/'
+
+
+class UserRelationsTest(FoodgramTestCase):
+    """Подписки пользователя читаются одним запросом на весь список."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Обычному пользователю djoser показывает в списке только его.
+        cls.user = cls.create_user()
+        User.objects.filter(pk=cls.user.pk).update(is_staff=True)
+        cls.first, cls.second = cls.create_user(), cls.create_user()
+
+    def setUp(self):
+        self.login(self.user)
+
+    def subscribed(self, queries=4):
+        # Токен, COUNT, страница пользователей и подписки.
+        with self.assertNumQueries(queries):
+            response = self.client.get(URL, {'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        return {item['id'] for item in response.data['results']
+                if item['is_subscribed']}
+
+    def subscribe(self, author, method='post'):
+        response = getattr(self.client, method)(
+            f'{URL}{author.pk}/subscribe/')
+        self.assertIn(response.status_code, (201, 204))
+
+    def test_subscribe_and_unsubscribe(self):
+        self.assertEqual(self.subscribed(), set())
+        self.subscribe(self.first)
+        self.subscribe(self.second)
+        self.assertEqual(self.subscribed(), {self.first.pk, self.second.pk})
+        self.subscribe(self.first, 'delete')
+        self.assertEqual(self.subscribed(), {self.second.pk})
+
+    def test_queries_do_not_grow(self):
+        self.subscribe(self.first)
+        for _ in range(5):
+            self.create_user()
+        self.assertEqual(self.subscribed(), {self.first.pk})
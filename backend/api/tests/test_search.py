@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from recipes.models import Ingredient, IngredientAmount, Recipe
+from recipes.search import update_search
+
+from .base import FoodgramTestCase
+
+URL = '/api/recipes/'
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    """Совпадение в названии выше совпадения в ингредиентах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.tags = cls.create_user(), cls.create_tags()
+        cls.carrot = Ingredient.objects.create(
+            name='Морковь', measurement_point='г')
+        cls.salad = cls.create_recipe(
+            cls.author, cls.tags, [cls.carrot], name='Салат')
+        cls.by_name = cls.create_recipe(
+            cls.author, cls.tags, cls.create_ingredients(),
+            name='Морковь по-корейски')
+        cls.other = cls.create_recipe(
+            cls.author, cls.tags, cls.create_ingredients(), name='Суп')
+        update_search([cls.salad.pk, cls.by_name.pk, cls.other.pk])
+
+    def found(self, query):
+        response = self.client.get(URL, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_above_ingredient(self):
+        self.assertEqual(self.found('морковь'),
+                         [self.by_name.pk, self.salad.pk])
+        self.assertEqual(self.found('суп'), [self.other.pk])
+        self.assertEqual(self.found('морковь суп'), [])
+
+    def test_fallback(self):
+        # Так ищут на базах без tsvector: индекс в памяти процесса.
+        with mock.patch('recipes.search.uses_postgresql',
+                        return_value=False):
+            self.assertEqual(self.found('морковь'),
+                             [self.by_name.pk, self.salad.pk])
+            self.assertEqual(self.found('МОРКОВИ корейски'),
+                             [self.by_name.pk])
+
+    def test_amount_changed_in_admin(self):
+        request = RequestFactory().post('/admin/')
+        request.user = self.author
+        admin = site._registry[IngredientAmount]
+        amount = IngredientAmount.objects.filter(recipe=self.other).first()
+        form = admin.get_form(request, amount)(instance=amount, data={
+            'recipe': amount.recipe_id, 'ingredient': self.carrot.pk,
+            'amount': amount.amount,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.save_model(request, form.save(commit=False), form, True)
+        self.assertIn(self.other.pk, self.found('морковь'))
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.delete_queryset(request, IngredientAmount.objects.filter(
+                ingredient=self.carrot))
+        self.assertEqual(self.found('морковь'), [self.by_name.pk])
+        self.assertFalse(Recipe.objects.filter(
+            ingredients__ingredient=self.carrot).exists())
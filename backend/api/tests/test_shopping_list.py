@@ -0,0 +1,82 @@
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from recipes.autocomplete import ingredient_index
+from recipes.models import IngredientAmount, Recipe, ShoppingCart
+
+from .base import FoodgramTestCase
+
+URL = '/api/recipes/download_shopping_cart/?format=txt'
+
+
+class ShoppingListCacheTest(FoodgramTestCase):
+    """Кэш списка покупок сбрасывается при правках в админке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.ingredients = cls.create_ingredients(2)
+        cls.recipes = [
+            cls.create_recipe(cls.user, cls.create_tags(1), [ingredient])
+            for ingredient in cls.ingredients
+        ]
+        for recipe in cls.recipes:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Recipe.objects.update(carts_count=1)
+
+    def setUp(self):
+        self.login(self.user)
+        self.request = RequestFactory().post('/admin/')
+        self.request.user = self.user
+
+    def download(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ingredient_rename(self):
+        self.assertIn(self.ingredients[0].name, self.download())
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Переименованный продукт'
+        ingredient.save()
+        ingredient_index.invalidate()
+        self.assertIn('Переименованный продукт', self.download())
+
+    def test_recipe_deleted_in_admin(self):
+        self.assertIn(self.ingredients[1].name, self.download())
+        site._registry[Recipe].delete_model(self.request, self.recipes[1])
+        self.assertNotIn(self.ingredients[1].name, self.download())
+
+    def test_amount_changed_in_admin(self):
+        self.assertIn('— 2', self.download())
+        amount = IngredientAmount.objects.get(recipe=self.recipes[0])
+        form = site._registry[IngredientAmount].get_form(
+            self.request, amount)(instance=amount, data={
+                'recipe': amount.recipe_id,
+                'ingredient': amount.ingredient_id,
+                'amount': 7,
+            })
+        self.assertTrue(form.is_valid(), form.errors)
+        site._registry[IngredientAmount].save_model(
+            self.request, form.save(commit=False), form, True)
+        self.assertIn('— 7', self.download())
+
+    def test_cart_edited_in_admin(self):
+        admin = site._registry[ShoppingCart]
+        self.assertIn(self.ingredients[1].name, self.download())
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.delete_model(self.request, ShoppingCart.objects.get(
+                user=self.user, recipe=self.recipes[1]))
+        self.assertNotIn(self.ingredients[1].name, self.download())
+        form = admin.get_form(self.request)(data={
+            'user': self.user.pk, 'recipe': self.recipes[1].pk,
+            'created_0': '2024-01-01', 'created_1': '10:00'})
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.save_model(self.request, form.save(commit=False), form,
+                             False)
+        self.assertIn(self.ingredients[1].name, self.download())
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.delete_queryset(self.request, ShoppingCart.objects.all())
+        self.assertNotIn(self.ingredients[0].name, self.download())
+        self.assertEqual(
+            Recipe.objects.filter(carts_count__gt=0).count(), 0)
@@ -0,0 +1,57 @@
+from users.models import Subscribe
+
+from .base import FoodgramTestCase
+
+URL = '/api/users/subscriptions/?recipes_limit=2'
+
+
+class SubscriptionsQueriesTest(FoodgramTestCase):
+    """Подписки: постоянное число SQL-запросов и проверка recipes_limit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.tags = cls.create_tags(1)
+        cls.ingredients = cls.create_ingredients(1)
+        cls.add_authors(2, 1)
+
+    @classmethod
+    def add_authors(cls, total, recipes):
+        for _ in range(total):
+            author = cls.create_user()
+            for _ in range(recipes):
+                cls.create_recipe(author, cls.tags, cls.ingredients)
+            Subscribe.objects.create(user=cls.user, author=author)
+
+    def assert_queries(self, queries):
+        self.client.get(URL)
+        with self.assertNumQueries(queries):
+            response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_constant_queries(self):
+        self.login(self.user)
+        response = self.assert_queries(4)
+        self.assertEqual(response.data['count'], 2)
+        self.add_authors(4, 5)
+        response = self.assert_queries(4)
+        self.assertEqual(response.data['count'], 6)
+        self.assertTrue(all(
+            len(author['recipes']) <= 2
+            for author in response.data['results']))
+        self.assertIn(5, [author['recipes_count']
+                          for author in response.data['results']])
+
+    def test_invalid_recipes_limit(self):
+        self.login(self.user)
+        for value in ('-1', 'abc'):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    f'/api/users/subscriptions/?recipes_limit={value}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+        author = self.create_user()
+        response = self.client.post(
+            f'/api/users/{author.pk}/subscribe/?recipes_limit=abc')
+        self.assertEqual(response.status_code, 400)
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
+from .async_views import ROUTES, serves
 from .views import (
     CustomUserViewSet,
     IngredientViewSet,
@@ -21,3 +23,10 @@ urlpatterns = [
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READS:
+    sync_views = {pattern.name: pattern.callback for pattern in router.urls}
+    urlpatterns = [
+        path(route, serves(sync_views[name], view))
+        for route, name, view in ROUTES
+    ] + urlpatterns
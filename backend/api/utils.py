@@ -1,10 +1,107 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
 from django.shortcuts import get_object_or_404
+from recipes.models import IngredientAmount, Recipe, ShoppingCart
+from recipes.versions import INGREDIENTS, get_version
 from rest_framework.response import Response
 from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
                                    HTTP_400_BAD_REQUEST)
+from users.models import User
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно сдвигает денормализованный счётчик на delta."""
+
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """change_counter для нескольких строк одним UPDATE."""
+
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def bump_cart_version(users):
+    """Сбрасывает кэш списка покупок для users."""
+
+    users.update(cart_version=F('cart_version') + 1)
+
+
+def lock_user(user):
+    """Блокирует строку user до конца транзакции.
+
+    Добавления в избранное и корзину одного пользователя идут по
+    очереди, поэтому проверка уже добавленных рецептов точна и
+    счётчики сдвигаются ровно на число вставленных строк.
+    """
+
+    list(User.objects.select_for_update().filter(
+        pk=user.pk).values_list('pk'))
+
+
+def shopping_list_key(user):
+    # Версия продуктов - на случай переименования в админке
+    # или в loadmodels --update.
+    return (f'shopping_list:{user.pk}:{user.cart_version}:'
+            f'{get_version(INGREDIENTS)}')
+
+
+def shopping_list_rows(user):
+    """Суммы продуктов из корзины user: (название, единица, количество)."""
+
+    return IngredientAmount.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_point'
+    ).annotate(ingredient_amount=Sum('amount')).order_by(
+        'ingredient__name', 'ingredient__measurement_point'
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_point',
+        'ingredient_amount'
+    )
+
 
+def shopping_list(user):
+    """Строки списка покупок из кэша или из базы с записью в кэш.
 
-def add_remove(self, request, target, obj, target_obj):
+    Ключ содержит версии корзины и справочника продуктов, поэтому при
+    их изменении старые записи просто перестают читаться.
+    """
+
+    key = shopping_list_key(user)
+    rows = cache.get(key)
+    if rows is not None:
+        yield from rows
+        return
+    rows = []
+    for row in shopping_list_rows(user).iterator(
+            chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE):
+        rows.append(row)
+        yield row
+    cache.set(key, rows, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+async def ashopping_list(user):
+    """shopping_list для async-представлений.
+
+    Строки читаются целиком до начала ответа, поэтому рендерер потом
+    не обращается к базе из event loop.
+    """
+
+    key = shopping_list_key(user)
+    rows = await cache.aget(key)
+    if rows is None:
+        rows = [row async for row in shopping_list_rows(user)]
+        await cache.aset(key, rows, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return rows
+
+
+def add_remove(self, request, target, obj, target_obj, counter=None):
 
     success_delete = {
         'detail': f"Success delete from your {obj.__name__}'s list"}
@@ -17,19 +114,73 @@ def add_remove(self, request, target, obj, target_obj):
         'user': user,
         target: get_obj
     }
-    filtered = obj.objects.filter(**target_kwargs)
 
-    if request.method == 'POST' and filtered.exists():
-        return Response(already_in_list, status=HTTP_400_BAD_REQUEST)
     if request.method == 'POST':
-        obj.objects.create(**target_kwargs)
+        try:
+            with transaction.atomic():
+                lock_user(user)
+                obj.objects.create(**target_kwargs)
+                if counter:
+                    change_counter(target_obj, get_obj.pk, counter, 1)
+                if obj is ShoppingCart:
+                    bump_cart_version(User.objects.filter(pk=user.pk))
+        except IntegrityError:
+            return Response(already_in_list, status=HTTP_400_BAD_REQUEST)
         serializer = self.serializer_class(get_obj)
         return Response(serializer.data, status=HTTP_201_CREATED)
 
-    if request.method == 'DELETE' and filtered.exists():
-        filtered.delete()
-        return Response(success_delete, status=HTTP_204_NO_CONTENT)
     if request.method == 'DELETE':
-        return Response(not_in_list, status=HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted, _ = obj.objects.filter(**target_kwargs).delete()
+            if not deleted:
+                return Response(not_in_list, status=HTTP_400_BAD_REQUEST)
+            if counter:
+                change_counter(target_obj, get_obj.pk, counter, -1)
+            if obj is ShoppingCart:
+                bump_cart_version(User.objects.filter(pk=user.pk))
+        return Response(success_delete, status=HTTP_204_NO_CONTENT)
 
     return True
+
+
+@transaction.atomic
+def add_many(user, obj, recipes, counter):
+    """Добавляет пачку рецептов в список obj: один INSERT на всю пачку.
+
+    Уже добавленные рецепты пропускаются. Под блокировкой пользователя
+    параллельный запрос не вставит те же строки между проверкой и
+    INSERT, и счётчики растут только для действительно новых строк.
+    """
+
+    lock_user(user)
+    existing = set(obj.objects.filter(
+        user=user, recipe__in=recipes).values_list('recipe_id', flat=True))
+    new = [recipe.pk for recipe in recipes if recipe.pk not in existing]
+    obj.objects.bulk_create([obj(user=user, recipe_id=pk) for pk in new])
+    change_counters(Recipe, new, counter, 1)
+    if new and obj is ShoppingCart:
+        bump_cart_version(User.objects.filter(pk=user.pk))
+
+
+@transaction.atomic
+def remove_many(user, obj, ids, counter):
+    """Убирает пачку рецептов из списка obj одним DELETE ... IN."""
+
+    removed = list(obj.objects.select_for_update().filter(
+        user=user, recipe__in=ids).values_list('recipe_id', flat=True))
+    obj.objects.filter(user=user, recipe__in=removed).delete()
+    change_counters(Recipe, removed, counter, -1)
+    if removed and obj is ShoppingCart:
+        bump_cart_version(User.objects.filter(pk=user.pk))
+
+
+def attach_recipes(subscriptions, recipes_limit=None):
+    """Подгружает превью рецептов для всех подписок одним запросом."""
+
+    recipes = defaultdict(list)
+    authors = [subscription.author_id for subscription in subscriptions]
+    for recipe in Recipe.objects.first_per_author(authors, recipes_limit):
+        recipes[recipe.author_id].append(recipe)
+    for subscription in subscriptions:
+        subscription.recipe_previews = recipes[subscription.author_id]
+    return subscriptions
@@ -1,29 +1,53 @@
-import csv
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils.decorators import method_decorator
+from django.utils.module_loading import import_string
 from django.utils.translation import gettext as _
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from djoser.views import UserViewSet
 from rest_framework import status, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
+from recipes.autocomplete import ingredient_index
+from recipes.images import release_image
+from recipes.search import forget_search
 from recipes.models import (FavoriteRecipe, Ingredient,
-                            Recipe, ShoppingCart, Tag, IngredientAmount)
+                            Recipe, ShoppingCart, Tag)
 from users.models import User, Subscribe
+from .bulk import bulk_create, bulk_delete, bulk_update
+from .conditional import (ingredients_etag, ingredients_last_modified,
+                          recipe_etag, recipe_last_modified, tags_etag,
+                          tags_last_modified)
+from .feed import feed_ids, invalidate_feed, invalidate_feeds
 from .filters import RecipeFilter, IngredientFilter
-from .paginator import FoodgramPafination
+from .parsers import NDJSONParser
+from .paginator import FoodgramCursorPagination, FoodgramPafination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeEditSerializer,
+from .serializers import (BulkModeSerializer, IngredientSearchSerializer,
+                          IngredientSerializer, RecipeEditSerializer,
+                          RecipeIdsSerializer, RecipesLimitSerializer,
                           RecipesSerializer, TagSerializer,
                           UserSubscribeSerializer, SubscribeRecipeSerializer)
-from .utils import add_remove
+from .utils import (add_many, add_remove, attach_recipes,
+                    bump_cart_version, change_counter, remove_many,
+                    shopping_list)
 
 
+@method_decorator(condition(etag_func=tags_etag,
+                            last_modified_func=tags_last_modified),
+                  name='list')
+@method_decorator(condition(etag_func=tags_etag,
+                            last_modified_func=tags_last_modified),
+                  name='retrieve')
 class TagViewSet(ModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
@@ -33,18 +57,43 @@ class TagViewSet(ModelViewSet):
 
 
 class RecipeViewSet(ModelViewSet):
-    queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ('get', 'post', 'patch', 'delete')
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = FoodgramPafination
 
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator')
+                and self.request.query_params.get('pagination') == 'cursor'):
+            self._paginator = FoodgramCursorPagination()
+        return super().paginator
+
+    def get_queryset(self):
+        return Recipe.objects.with_relations().with_user_flags(
+            self.request.user)
+
     def get_serializer_class(self):
         if self.request.method not in SAFE_METHODS:
             return RecipeEditSerializer
         return RecipesSerializer
 
+    @method_decorator(condition(etag_func=recipe_etag,
+                                last_modified_func=recipe_last_modified))
+    @method_decorator(vary_on_headers('Authorization'))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+        bump_cart_version(User.objects.filter(shopping_cart__recipe=instance))
+        instance.delete()
+        forget_search()
+        transaction.on_commit(lambda: invalidate_feeds([instance.author_id]))
+        release_image(instance.image.name, instance.image_variants)
+
     @action(
         methods=['POST', 'DELETE'],
         detail=False,
@@ -54,7 +103,8 @@ class RecipeViewSet(ModelViewSet):
     )
     def favorite(self, request, *args, **kwargs):
         self.serializer_class = SubscribeRecipeSerializer
-        return add_remove(self, request, 'recipe', FavoriteRecipe, Recipe)
+        return add_remove(self, request, 'recipe', FavoriteRecipe, Recipe,
+                          'favorites_count')
 
     @action(
         methods=['POST', 'DELETE'],
@@ -65,34 +115,132 @@ class RecipeViewSet(ModelViewSet):
     )
     def cart(self, request, *args, **kwargs):
         self.serializer_class = SubscribeRecipeSerializer
-        return add_remove(self, request, 'recipe', ShoppingCart, Recipe)
+        return add_remove(self, request, 'recipe', ShoppingCart, Recipe,
+                          'carts_count')
+
+    def toggle_many(self, request, obj, counter):
+        """Добавление или удаление списка рецептов: тело - список id."""
+        params = RecipeIdsSerializer(data={'recipes': request.data})
+        params.is_valid(raise_exception=True)
+        ids = params.validated_data['recipes']
+        if request.method == 'DELETE':
+            remove_many(request.user, obj, ids, counter)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipes = Recipe.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in recipes]
+        if missing:
+            return Response({'errors': _('Рецепты не найдены'),
+                             'recipes': missing},
+                            status=status.HTTP_404_NOT_FOUND)
+        add_many(request.user, obj, list(recipes.values()), counter)
+        serializer = SubscribeRecipeSerializer(
+            recipes.values(), many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='favorite',
+        url_name='favorite_many',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_many(self, request):
+        return self.toggle_many(request, FavoriteRecipe, 'favorites_count')
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='shopping_cart',
+        url_name='cart_many',
+        permission_classes=[IsAuthenticated]
+    )
+    def cart_many(self, request):
+        return self.toggle_many(request, ShoppingCart, 'carts_count')
+
+    @action(
+        methods=['POST', 'PATCH', 'DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        parser_classes=[JSONParser, NDJSONParser],
+    )
+    def bulk(self, request):
+        """Массовые операции с рецептами: JSON-массив или NDJSON.
+
+        По умолчанию пачка применяется целиком или не применяется вовсе;
+        с ?atomic=false валидные элементы сохраняются, а для остальных
+        возвращаются ошибки.
+        """
+        params = BulkModeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'errors': 'Ожидается непустой список'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.RECIPE_BULK_MAX_ITEMS:
+            return Response(
+                {'errors': f'Не больше {settings.RECIPE_BULK_MAX_ITEMS} '
+                           f'элементов за запрос'},
+                status=status.HTTP_400_BAD_REQUEST)
+        handler = {
+            'POST': bulk_create,
+            'PATCH': bulk_update,
+            'DELETE': bulk_delete,
+        }[request.method]
+        results = handler(items, request.user, self.get_serializer_context(),
+                          params.validated_data['atomic'])
+        results = [results[index] for index in sorted(results)]
+        failed = [result for result in results if 'errors' in result]
+        if not failed:
+            response_status = status.HTTP_200_OK
+            if request.method == 'POST':
+                response_status = status.HTTP_201_CREATED
+        elif len(failed) == len(results):
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response(results, status=response_status)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые сверху, с курсором."""
+        paginator = FoodgramCursorPagination()
+        page_size = paginator.get_page_size(request)
+        ids = feed_ids(request.user, paginator.decode_cursor(request),
+                       page_size + 1)
+        recipes = self.get_queryset().in_bulk(ids)
+        page = paginator.set_page(
+            request, [recipes[pk] for pk in ids if pk in recipes], page_size)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(
         methods=['get'],
         detail=False,
         permission_classes=[IsAuthenticated, ],
+        renderer_classes=[
+            import_string(renderer)
+            for renderer in settings.SHOPPING_LIST_RENDERERS
+        ],
     )
     def download_shopping_cart(self, request):
-        user = self.request.user
-        if user.is_anonymous:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        ingredients = IngredientAmount.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_point'
-        ).annotate(ingredient_amount=Sum('amount')).values_list(
-            'ingredient__name', 'ingredient__measurement_point',
-            'ingredient_amount')
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = ('attachment;'
-                                           'filename="Shoppingcart.csv"')
-        response.write(u'\ufeff'.encode('utf8'))
-        writer = csv.writer(response)
-        for item in list(ingredients):
-            writer.writerow(item)
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(shopping_list(request.user)),
+            content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment;filename="Shoppingcart.{renderer.extension}"')
         return response
 
 
+@method_decorator(condition(etag_func=ingredients_etag,
+                            last_modified_func=ingredients_last_modified),
+                  name='list')
+@method_decorator(condition(etag_func=ingredients_etag,
+                            last_modified_func=ingredients_last_modified),
+                  name='retrieve')
 class IngredientViewSet(ModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
@@ -102,13 +250,32 @@ class IngredientViewSet(ModelViewSet):
     pagination_class = None
     http_method_names = ('get',)
 
+    def list(self, request, *args, **kwargs):
+        params = IngredientSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        name = params.validated_data.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        ingredients = ingredient_index.search(
+            name, params.validated_data.get('limit'))
+        return Response(self.get_serializer(ingredients, many=True).data)
+
 
 class CustomUserViewSet(UserViewSet):
 
+    def get_recipes_limit(self):
+        params = RecipesLimitSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data.get('recipes_limit')
+
     @action(detail=False, permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        queryset = Subscribe.objects.filter(user=request.user)
-        page = self.paginate_queryset(queryset)
+        recipes_limit = self.get_recipes_limit()
+        queryset = Subscribe.objects.filter(
+            user=request.user
+        ).select_related('author').annotate(is_subscribed=Value(True))
+        page = attach_recipes(self.paginate_queryset(queryset),
+                              recipes_limit)
         serializer = UserSubscribeSerializer(page, many=True,
                                              context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -123,13 +290,19 @@ class CustomUserViewSet(UserViewSet):
             return Response({'errors':
                             _('Вы не можете подписаться на себя.')},
                             status=status.HTTP_400_BAD_REQUEST)
-        if Subscribe.objects.filter(user=user, author=author).exists():
+        recipes_limit = self.get_recipes_limit()
+        try:
+            with transaction.atomic():
+                subscription = Subscribe.objects.create(
+                    user=user, author=author)
+                change_counter(User, author.pk, 'followers_count', 1)
+        except IntegrityError:
             return Response({'errors':
                             _('Вы уже подписались на автора.')},
                             status=status.HTTP_400_BAD_REQUEST)
-        Subscribe.objects.create(user=user, author=author)
-        queryset = Subscribe.objects.get(user=request.user, author=author)
-        serializer = UserSubscribeSerializer(queryset,
+        invalidate_feed(user)
+        attach_recipes([subscription], recipes_limit)
+        serializer = UserSubscribeSerializer(subscription,
                                              context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -137,8 +310,12 @@ class CustomUserViewSet(UserViewSet):
     def subscribe_del(self, request, id=None):
         user = request.user
         author = get_object_or_404(User, id=id)
-        if not Subscribe.objects.filter(user=user, author=author).exists():
-            return Response({'errors': 'Подписки не существует.'},
-                            status=status.HTTP_400_BAD_REQUEST)
-        Subscribe.objects.get(user=user, author=author).delete()
+        with transaction.atomic():
+            deleted = Subscribe.objects.filter(
+                user=user, author=author).delete()[0]
+            if not deleted:
+                return Response({'errors': 'Подписки не существует.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            change_counter(User, author.pk, 'followers_count', -1)
+        invalidate_feed(user)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,70 @@
+"""Бэкенд PostgreSQL, который берёт соединения из пула процесса.
+
+Django 4.2 со psycopg2 не умеет пул сам, поэтому соединение, которое
+Django закрывает в конце запроса (CONN_MAX_AGE = 0), возвращается
+в psycopg2.pool.ThreadedConnectionPool и достаётся следующим запросом
+без нового подключения и TLS.
+"""
+from threading import Lock
+
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+pools = {}
+pools_lock = Lock()
+
+
+class PooledDatabase:
+    """Модуль psycopg2, у которого connect() выдаёт соединение из пула."""
+
+    def __init__(self, connection_pool):
+        self.pool = connection_pool
+
+    def connect(self, **conn_params):
+        return self.pool.getconn()
+
+    def __getattr__(self, name):
+        return getattr(base.Database, name)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_pool(self, conn_params):
+        with pools_lock:
+            if self.alias not in pools:
+                # psycopg2 держит открытыми не больше SIZE свободных
+                # соединений, лишние закрывает при возврате.
+                options = self.settings_dict.get('POOL', {})
+                pools[self.alias] = pool.ThreadedConnectionPool(
+                    options.get('SIZE', 4), options.get('MAX_SIZE', 10),
+                    **conn_params)
+            return pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        connection_pool = self.get_pool(conn_params)
+        self.Database = PooledDatabase(connection_pool)
+        connection = super().get_new_connection(conn_params)
+        if self.health_check_enabled and not self.checked_out(connection):
+            connection_pool.putconn(connection, close=True)
+            return super().get_new_connection(conn_params)
+        return connection
+
+    def checked_out(self, connection):
+        """Проверка соединения из пула: сервер мог его уже закрыть."""
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # После ошибок соединение не возвращается, иначе его получит
+            # следующий запрос; незавершённую транзакцию пул откатит сам.
+            pools[self.alias].putconn(self.connection,
+                                      close=self.errors_occurred)
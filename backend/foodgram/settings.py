@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from distutils.util import strtobool
 from pathlib import Path
 
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,16 +71,38 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# С DB_POOL соединения берутся из пула процесса и возвращаются в него
+# в конце запроса; без пула живут CONN_MAX_AGE секунд (0 - по запросу).
+DB_POOL = bool(strtobool(os.getenv('DB_POOL', 'False')))
+
 DATABASES = {
     'default': {
         # Меняем настройку Django: теперь для работы будет использоваться
         # бэкенд postgresql
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': ('foodgram.db' if DB_POOL
+                   else 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (0 if DB_POOL
+                         else int(os.getenv('DB_CONN_MAX_AGE', 60))),
+        'CONN_HEALTH_CHECKS': bool(
+            strtobool(os.getenv('DB_CONN_HEALTH_CHECKS', 'True'))),
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', 4)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        },
+    }
+}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -139,6 +163,69 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+# Сколько секунд не удалять блоб после его загрузки.
+RECIPE_IMAGE_GRACE = int(os.getenv('RECIPE_IMAGE_GRACE', 60 * 60))
+RECIPE_SCORE_WEIGHTS = {'favorite': 1.0, 'cart': 2.0}
+RECIPE_TRENDING_WINDOW = timedelta(
+    days=int(os.getenv('RECIPE_TRENDING_WINDOW_DAYS', 7)))
+RECIPE_TRENDING_HALF_LIFE = timedelta(
+    hours=int(os.getenv('RECIPE_TRENDING_HALF_LIFE_HOURS', 24)))
+# 0 - лента подписок собирается при каждом запросе.
+RECIPE_FEED_CACHE_TIMEOUT = int(os.getenv('RECIPE_FEED_CACHE_TIMEOUT', 0))
+RECIPE_BULK_MAX_ITEMS = int(os.getenv('RECIPE_BULK_MAX_ITEMS', 500))
+
+SERVER_TIMING = bool(strtobool(os.getenv('SERVER_TIMING', 'True')))
+# /metrics/ отвечает только на Authorization: Bearer <METRICS_TOKEN>,
+# без токена эндпоинт отключён.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Предельное число SQL-запросов на действие: (без токена, с токеном),
+# проверка токена - ещё один SELECT. Превышение пишется в лог, а
+# соблюдение проверяет api/tests/test_query_budgets.py. У списка
+# рецептов запас на первый ?search= после изменений: без PostgreSQL
+# поисковый индекс в памяти тогда строится заново.
+QUERY_BUDGETS = {
+    'TagViewSet.list': (1, 2),
+    'TagViewSet.retrieve': (1, 2),
+    'IngredientViewSet.list': (1, 2),
+    'IngredientViewSet.retrieve': (1, 2),
+    'RecipeViewSet.list': (7, 8),
+    'RecipeViewSet.retrieve': (5, 6),
+    'RecipeViewSet.feed': (0, 8),
+    'RecipeViewSet.download_shopping_cart': (0, 4),
+    'CustomUserViewSet.list': (4, 5),
+    'CustomUserViewSet.me': (0, 3),
+    'CustomUserViewSet.subscriptions': (0, 6),
+}
+
+SHOPPING_LIST_RENDERERS = [
+    'api.renderers.CSVShoppingListRenderer',
+    'api.renderers.TXTShoppingListRenderer',
+    'api.renderers.PDFShoppingListRenderer',
+]
+SHOPPING_LIST_CHUNK_SIZE = int(os.getenv('SHOPPING_LIST_CHUNK_SIZE', 500))
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 60 * 60 * 24))
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+# Async-версии эндпоинтов чтения (api/async_views.py); имеет смысл
+# под ASGI, под WSGI каждый такой запрос идёт через async_to_sync.
+ASYNC_READS = bool(strtobool(os.getenv('ASYNC_READS', 'False')))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SEND_ACTIVATION_EMAIL': False,
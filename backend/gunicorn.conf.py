@@ -0,0 +1,60 @@
+# Настройки gunicorn; файл подхватывается сам из рабочей директории.
+import multiprocessing
+import os
+import shutil
+import tempfile
+from distutils.util import strtobool
+
+# GUNICORN_ASGI=True запускает foodgram.asgi на воркерах uvicorn
+# и включает async-версии эндпоинтов чтения (ASYNC_READS).
+asgi = bool(strtobool(os.getenv('GUNICORN_ASGI', 'False')))
+if asgi:
+    os.environ.setdefault('ASYNC_READS', 'True')
+    # Под ASGI запросы идут в разных потоках, постоянные соединения
+    # там копятся; переиспользование - через DB_POOL.
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+wsgi_app = ('foodgram.asgi:application' if asgi
+            else 'foodgram.wsgi:application')
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS',
+                        multiprocessing.cpu_count() * 2 + 1))
+# sync, gthread (вместе с GUNICORN_THREADS) или класс воркера ASGI.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS',
+                         'uvicorn.workers.UvicornWorker' if asgi else 'sync')
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 2))
+# Воркеры пишут метрики в файлы этого каталога, /metrics/ их складывает
+# (api/metrics.py). Переменная нужна до импорта prometheus_client.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+
+
+# Кэши, которые живут внутри одного процесса.
+LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def on_starting(server):
+    """Очищает каталог метрик и проверяет, что кэш общий для воркеров.
+
+    Файлы метрик прошлого запуска смешались бы с новыми счётчиками.
+    Несколько воркеров на кэше в памяти процесса не запускаются: в кэше
+    лежат метки версий справочников и рецептов (recipes/versions.py),
+    по ним сбрасываются индексы поиска, ETag и списки покупок. Изменение
+    в одном воркере или в manage.py другие воркеры тогда не увидят.
+    """
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    if server.cfg.workers < 2:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in LOCAL_CACHES:
+        raise RuntimeError(
+            f'{backend} is per-process, but {server.cfg.workers} workers '
+            'are configured: set CACHE_BACKEND and CACHE_LOCATION to a '
+            'shared cache (e.g. Redis) or GUNICORN_WORKERS=1.')
@@ -1,7 +1,52 @@
+from api.utils import bump_cart_version, change_counter
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from users.models import User
 
-from .models import (Ingredient, Tag, Recipe,
+from .autocomplete import ingredient_index
+from .models import (Ingredient, Tag, Recipe, RecipeScore,
                      IngredientAmount, ShoppingCart, FavoriteRecipe)
+from .search import forget_search, update_search
+from .versions import TAGS, bump_version
+
+
+class CountedRelationAdmin(admin.ModelAdmin):
+    """Правки связей в админке сдвигают денормализованный счётчик.
+
+    counter - (модель счётчика, поле связи с ней, имя счётчика), как
+    в change_counter у API.
+    """
+
+    counter = None
+
+    def change_counter(self, pk, delta):
+        model, _, name = self.counter
+        if pk is not None:
+            change_counter(model, pk, name, delta)
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        field = self.counter[1]
+        old = form.initial.get(field) if change else None
+        new = getattr(obj, f'{field}_id')
+        if old != new:
+            self.change_counter(old, -1)
+            self.change_counter(new, 1)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        self.change_counter(getattr(obj, f'{self.counter[1]}_id'), -1)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for pk, total in queryset.order_by().values_list(
+                self.counter[1]).annotate(total=Count('pk')):
+            self.change_counter(pk, -total)
+        super().delete_queryset(request, queryset)
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -9,38 +54,155 @@ class IngredientAdmin(admin.ModelAdmin):
     list_filter = ('name',)
     ordering = ('id',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(ingredient_index.invalidate)
+        if change:
+            update_search(Recipe.objects.filter(
+                ingredients__ingredient=obj).values('pk'))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(ingredient_index.invalidate)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(ingredient_index.invalidate)
+
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
     ordering = ('id',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(lambda: bump_version(TAGS))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(lambda: bump_version(TAGS))
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(lambda: bump_version(TAGS))
 
-class RecipeAdmin(admin.ModelAdmin):
+
+class RecipeAdmin(CountedRelationAdmin):
     list_display = ('created', 'name', 'author', 'favorite_count')
     list_editable = ('name',)
     list_filter = ('name', 'author', 'tags')
     ordering = ('created',)
     readonly_fields = ('favorite_count',)
+    counter = (User, 'author', 'recipes_count')
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            RecipeScore.objects.create(recipe=obj)
+        update_search([obj.pk])
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        bump_cart_version(User.objects.filter(shopping_cart__recipe=obj))
+        super().delete_model(request, obj)
+        forget_search()
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        bump_cart_version(
+            User.objects.filter(shopping_cart__recipe__in=queryset))
+        super().delete_queryset(request, queryset)
+        forget_search()
 
     def favorite_count(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
     favorite_count.short_description = 'Izbrannoe'
 
 
+def touch_recipes(recipes):
+    """Сдвигает дату изменения рецептов, чтобы сменился их ETag."""
+    Recipe.objects.filter(pk__in=recipes).update(updated=timezone.now())
+
+
 class AmountAdmin(admin.ModelAdmin):
+    """Изменение состава рецептов из админки.
+
+    Сбрасывает списки покупок и ETag этих рецептов и пересчитывает их
+    поисковые векторы.
+    """
+
     list_display = ('id', 'amount', 'ingredient', 'recipe')
     ordering = ('id',)
 
-
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
+    @staticmethod
+    def recipes_changed(recipes):
+        touch_recipes(recipes)
+        bump_cart_version(
+            User.objects.filter(shopping_cart__recipe__in=recipes))
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Количество могли перенести в другой рецепт.
+        recipes = {obj.recipe_id, form.initial.get('recipe')} - {None}
+        self.recipes_changed(recipes)
+        update_search(recipes)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        self.recipes_changed([obj.recipe_id])
+        super().delete_model(request, obj)
+        update_search([obj.recipe_id])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipes = set(queryset.values_list('recipe_id', flat=True))
+        self.recipes_changed(recipes)
+        super().delete_queryset(request, queryset)
+        update_search(recipes)
+
+
+class ShoppingCartAdmin(CountedRelationAdmin):
+    """Правки корзин сбрасывают кэш списков покупок их владельцев."""
+
+    list_display = ('user', 'recipe', 'created')
     ordering = ('user',)
+    counter = (Recipe, 'recipe', 'carts_count')
 
+    @staticmethod
+    def bump_carts(users):
+        users = set(users) - {None}
+        transaction.on_commit(lambda: bump_cart_version(
+            User.objects.filter(pk__in=users)))
 
-class FacRecipeAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Строку могли перенести в корзину другого пользователя.
+        self.bump_carts({obj.user_id, form.initial.get('user')})
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        self.bump_carts([obj.user_id])
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        self.bump_carts(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+
+
+class FacRecipeAdmin(CountedRelationAdmin):
+    list_display = ('user', 'recipe', 'created')
     ordering = ('user',)
+    counter = (Recipe, 'recipe', 'favorites_count')
+
+
+class RecipeScoreAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'popular', 'trending', 'refreshed')
+    ordering = ('-trending',)
 
 
 admin.site.register(Ingredient, IngredientAdmin)
@@ -49,3 +211,4 @@ admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(IngredientAmount, AmountAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(FavoriteRecipe, FacRecipeAdmin)
+admin.site.register(RecipeScore, RecipeScoreAdmin)
@@ -0,0 +1,75 @@
+from bisect import bisect_left
+from itertools import chain, islice
+from threading import Lock
+
+from .models import Ingredient
+from .versions import INGREDIENTS, bump_version, get_version
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Отсортированный в памяти процесса индекс названий продуктов.
+
+    Совпадения по началу названия идут раньше совпадений по подстроке.
+    Индекс привязан к версии справочника продуктов: invalidate() меняет
+    её, и каждый процесс перестраивает свою копию при следующем поиске.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = ([], [])
+        self.lock = Lock()
+
+    def build(self):
+        entries = sorted(
+            (normalize(name), pk, name, measurement_point)
+            for pk, name, measurement_point in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_point')
+        )
+        self.entries = (
+            [key for key, *_ in entries],
+            [
+                {'id': pk, 'name': name,
+                 'measurement_point': measurement_point}
+                for _, pk, name, measurement_point in entries
+            ]
+        )
+
+    def refresh(self):
+        version = get_version(INGREDIENTS)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build()
+                self.version = version
+
+    def invalidate(self):
+        bump_version(INGREDIENTS)
+
+    @staticmethod
+    def prefix_matches(keys, query):
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            yield position
+            position += 1
+
+    @staticmethod
+    def substring_matches(keys, query):
+        for position, key in enumerate(keys):
+            if query in key and not key.startswith(query):
+                yield position
+
+    def search(self, query, limit=None):
+        self.refresh()
+        keys, items = self.entries
+        query = normalize(query.strip())
+        positions = chain(self.prefix_matches(keys, query),
+                          self.substring_matches(keys, query))
+        return [items[position] for position in islice(positions, limit)]
+
+
+ingredient_index = IngredientIndex()
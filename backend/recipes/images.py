@@ -0,0 +1,154 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'avif': ('AVIF', {'quality': 60}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# Форматы, которые установленный Pillow умеет сохранять. Проверяется
+# один раз: features.check() на каждом вызове шумит предупреждениями.
+Image.init()
+SAVEABLE = frozenset(
+    extension for extension, (image_format, _) in FORMATS.items()
+    if image_format in Image.SAVE
+)
+
+
+def variant_formats():
+    """Форматы из настроек, которые поддерживает установленный Pillow."""
+    return [
+        name for name in settings.RECIPE_IMAGE_FORMATS if name in SAVEABLE
+    ]
+
+
+def variant_name(name, width, extension):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_{width}.{extension}')
+
+
+def build_variants(name):
+    """Создаёт уменьшенные копии изображения во всех форматах.
+
+    Возвращает {формат: {ширина: путь в хранилище}}.
+    """
+    with default_storage.open(name) as f:
+        original = Image.open(f)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands()
+                                    else 'RGB')
+    variants = {}
+    for width in settings.RECIPE_IMAGE_WIDTHS:
+        if width >= original.width and variants:
+            break
+        width = min(width, original.width)
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        for extension in variant_formats():
+            image_format, params = FORMATS[extension]
+            image = resized
+            if image_format == 'JPEG' and image.mode == 'RGBA':
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, image_format, **params)
+            path = default_storage.save(
+                variant_name(name, width, extension),
+                ContentFile(buffer.getvalue())
+            )
+            variants.setdefault(extension, {})[width] = path
+    return variants
+
+
+def generate_variants(recipe_id, name):
+    try:
+        variants = build_variants(name)
+        # update() не трогает auto_now, а от updated зависит ETag.
+        Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants=variants, updated=timezone.now())
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+
+
+def generate_in_worker(recipe_id, name):
+    try:
+        generate_variants(recipe_id, name)
+    finally:
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.RECIPE_IMAGE_WORKERS,
+        thread_name_prefix='recipe-images'
+    )
+
+
+def image_paths(name, variants):
+    """Оригинал и все его уменьшенные копии."""
+    paths = {name} if name else set()
+    for widths in variants.values():
+        paths.update(widths.values())
+    return paths
+
+
+def referenced_paths():
+    """Все пути в хранилище, на которые ссылаются рецепты."""
+    paths = set()
+    for name, variants in Recipe.objects.values_list(
+            'image', 'image_variants').iterator():
+        paths |= image_paths(name, variants)
+    return paths
+
+
+def release_image(name, variants):
+    """Удаляет изображение после коммита, если на него больше нет ссылок.
+
+    Блобы общие для рецептов с одинаковым фото, поэтому удаление
+    происходит, только когда счётчик ссылок на оригинал стал нулевым.
+    Файлы, загруженные заново меньше RECIPE_IMAGE_GRACE секунд назад,
+    остаются: ссылка на них может быть в ещё не закоммиченной
+    транзакции. Их потом уберёт gc_media.
+    """
+    paths = image_paths(name, variants)
+
+    def delete():
+        if Recipe.objects.filter(image=name).exists():
+            return
+        for path in paths:
+            default_storage.delete_stale(path, settings.RECIPE_IMAGE_GRACE)
+
+    if paths:
+        transaction.on_commit(delete)
+
+
+def schedule_variants(recipe):
+    """Ставит обработку изображения в пул после фиксации транзакции.
+
+    При RECIPE_IMAGE_WORKERS = 0 обработка идёт сразу в том же потоке.
+    """
+    recipe_id, name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            get_executor().submit(generate_in_worker, recipe_id, name)
+        else:
+            generate_variants(recipe_id, name)
+
+    transaction.on_commit(submit)
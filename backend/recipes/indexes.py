@@ -0,0 +1,16 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import Index
+
+
+class SearchIndex(GinIndex):
+    """GIN-индекс на PostgreSQL, обычный индекс на остальных базах.
+
+    Нужен, чтобы схема с полнотекстовым полем создавалась и на SQLite,
+    где проект запускают локально.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using=using,
+                                      **kwargs)
+        return Index.create_sql(self, model, schema_editor, **kwargs)
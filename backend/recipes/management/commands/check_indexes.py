@@ -0,0 +1,87 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import FavoriteRecipe, Recipe, RecipeScore, ShoppingCart
+from recipes.search import search_recipes
+from users.models import Subscribe
+
+
+def hot_queries():
+    """(описание, queryset, индекс, который должен быть в плане)."""
+    recipe = Recipe.objects.order_by('pk').first()
+    author = recipe.author_id if recipe else 0
+    recipe = recipe.pk if recipe else 0
+    return [
+        ('recipe list', Recipe.objects.order_by('-created', '-id')[:6],
+         'recipe_created_id_idx'),
+        ('recipes of author',
+         Recipe.objects.filter(author=author).order_by('-created', '-id')[:6],
+         'recipe_author_created_idx'),
+        ('recipe search', search_recipes(Recipe.objects.all(), 'суп')[:6],
+         'recipe_search_vector_idx'),
+        ('popular recipes',
+         RecipeScore.objects.order_by('-popular', '-recipe_id')[:6],
+         'score_popular_idx'),
+        ('favorites of user',
+         FavoriteRecipe.objects.filter(user=author).values('recipe'),
+         'unique_favorite'),
+        ('is favorited',
+         FavoriteRecipe.objects.filter(user=author, recipe=recipe),
+         'unique_favorite'),
+        ('cart of user',
+         ShoppingCart.objects.filter(user=author).values('recipe'),
+         'unique_cart'),
+        ('is in cart',
+         ShoppingCart.objects.filter(user=author, recipe=recipe),
+         'unique_cart'),
+        ('subscriptions of user',
+         Subscribe.objects.filter(user=author).order_by().values('author'),
+         'unique_recording'),
+        ('is subscribed',
+         Subscribe.objects.filter(user=author, author=author).order_by(),
+         'unique_recording'),
+    ]
+
+
+def plan_indexes(plan):
+    """Имена всех индексов из плана EXPLAIN (FORMAT JSON)."""
+    names = set()
+    if isinstance(plan, dict):
+        if 'Index Name' in plan:
+            names.add(plan['Index Name'])
+        for value in plan.values():
+            names |= plan_indexes(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            names |= plan_indexes(item)
+    return names
+
+
+class Command(BaseCommand):
+    help = ('Проверяет по EXPLAIN, что горячие запросы могут идти '
+            'по своим индексам (только PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка работает только на PostgreSQL')
+        failed = []
+        with transaction.atomic():
+            # На маленьких таблицах планировщик выбирает Seq Scan, поэтому
+            # он отключается: проверяется, что индекс вообще применим.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset, index in hot_queries():
+                used = plan_indexes(json.loads(queryset.explain(
+                    format='json')))
+                if index in used:
+                    self.stdout.write(f'{name}: {index}')
+                else:
+                    failed.append(name)
+                    self.stderr.write(
+                        f'{name}: expected {index}, plan uses '
+                        f'{", ".join(sorted(used)) or "no index"}')
+        if failed:
+            raise CommandError(
+                f'Запросы без нужного индекса: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use indexes'))
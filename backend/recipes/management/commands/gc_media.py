@@ -0,0 +1,52 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.images import referenced_paths
+from recipes.models import Recipe
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы изображений, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', default=settings.RECIPE_IMAGE_GRACE,
+                            type=int,
+                            help='Не трогать файлы моложе стольких секунд')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        root = Recipe._meta.get_field('image').upload_to
+        if not default_storage.exists(root):
+            return
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        # Список файлов берётся раньше ссылок: файл, загруженный после
+        # снимка ссылок, моложе min_age и delete_stale его не тронет.
+        paths = list(walk(default_storage, root))
+        referenced = referenced_paths()
+        removed = 0
+        for path in paths:
+            # *.deleted - файлы, которые прямо сейчас удаляет delete_stale.
+            if path in referenced or path.endswith('.deleted'):
+                continue
+            if options['dry_run']:
+                if default_storage.get_modified_time(path) > threshold:
+                    continue
+            elif not default_storage.delete_stale(path, options['min_age']):
+                continue
+            removed += 1
+            self.stdout.write(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Unreferenced files: {removed}'))
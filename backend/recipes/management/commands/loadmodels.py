@@ -1,37 +1,210 @@
+import csv
+import io
 import json
 import os
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import connection, transaction
 from django.utils.translation import gettext as _
-from recipes.models import Ingredient
+from recipes.autocomplete import ingredient_index, normalize
+from recipes.models import Ingredient, Recipe
+from recipes.search import update_search
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+READ_SIZE = 64 * 1024
+
+
+def read_json(f, skipped):
+    """Построчно разбирает JSON-массив объектов, не загружая его целиком.
+
+    Номера объектов без name или measurement_unit попадают в skipped.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(_('Ожидался JSON-массив'))
+    buffer = buffer[1:]
+    number = 0
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                raise CommandError(_('Файл JSON оборван'))
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        number += 1
+        try:
+            yield str(item['name']), str(item['measurement_unit'])
+        except (KeyError, TypeError):
+            skipped.append(number)
+
+
+def read_csv(f, skipped):
+    """Строки CSV; номера строк без двух колонок попадают в skipped."""
+
+    reader = csv.reader(f)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) < 2:
+            skipped.append(reader.line_num)
+            continue
+        yield row[0], row[1]
+
+
+def read_rows(f, skipped):
+    """Определяет формат по первому символу: '[' - JSON, иначе CSV."""
+
+    head = f.read(1)
+    while head.isspace():
+        head = f.read(1)
+    f.seek(0)
+    if head == '[':
+        return read_json(f, skipped)
+    return read_csv(f, skipped)
 
 
 class Command(BaseCommand):
+    help = 'Загружает продукты из JSON или CSV файла'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.json', nargs='?',
                             type=str)
+        parser.add_argument('--batch-size', default=1000, type=int,
+                            help='Сколько строк вставлять за один запрос')
+        parser.add_argument('--update', action='store_true',
+                            help='Обновлять написание уже существующих '
+                                 'продуктов, совпадающих без учёта регистра')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
 
     def handle(self, *args, **options):
+        path = os.path.join(DATA_ROOT, options['filename'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        self.processed = 0
+        self.updated = 0
+        skipped = []
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['update'] and not options['no_copy'])
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(name=ingredient["name"],
-                                                  measurement_point=ingredient[
-                                                      "measurement_unit"])
-                    except IntegrityError:
-                        print(f'Ingredient {ingredient["name"]} '
-                              f'{ingredient["measurement_unit"]} '
-                              f'already added to the database')
-
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                with transaction.atomic():
+                    before = Ingredient.objects.count()
+                    rows = self.unique(read_rows(f, skipped))
+                    if use_copy:
+                        self.copy(rows)
+                    else:
+                        self.bulk(rows, options['update'])
+                    created = Ingredient.objects.count() - before
         except FileNotFoundError:
             raise CommandError(
                 _(f'The file is missing in the data folder{DATA_ROOT}')
             )
+        ingredient_index.invalidate()
+        if skipped:
+            self.stderr.write(
+                f'Skipped {len(skipped)} malformed rows: '
+                f'{", ".join(map(str, skipped[:20]))}'
+                f'{" ..." if len(skipped) > 20 else ""}')
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {self.processed} rows in {elapsed:.2f}s '
+            f'({self.rate(elapsed)} rows/s): created {created}, '
+            f'updated {self.updated}'
+        ))
+
+    def rate(self, elapsed):
+        return int(self.processed / elapsed) if elapsed else self.processed
+
+    def progress(self):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'{self.processed} rows, {self.rate(elapsed)} rows/s')
+
+    def unique(self, rows):
+        seen = set()
+        for name, measurement_point in rows:
+            name, measurement_point = name.strip(), measurement_point.strip()
+            key = (normalize(name), normalize(measurement_point))
+            if not name or key in seen:
+                continue
+            seen.add(key)
+            yield key, name, measurement_point
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def bulk(self, rows, update):
+        existing, exact = {}, set()
+        if update:
+            for ingredient in Ingredient.objects.all():
+                existing[(normalize(ingredient.name.strip()),
+                          normalize(ingredient.measurement_point.strip()))
+                         ] = ingredient
+                exact.add((ingredient.name, ingredient.measurement_point))
+        for batch in self.batches(rows):
+            new, changed = [], []
+            for key, name, measurement_point in batch:
+                ingredient = existing.get(key)
+                if (name, measurement_point) in exact:
+                    continue
+                if ingredient is None:
+                    new.append(Ingredient(
+                        name=name, measurement_point=measurement_point))
+                else:
+                    ingredient.name = name
+                    ingredient.measurement_point = measurement_point
+                    changed.append(ingredient)
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(
+                changed, ('name', 'measurement_point'))
+            if changed:
+                update_search(Recipe.objects.filter(
+                    ingredients__ingredient__in=changed).values('pk'))
+            self.updated += len(changed)
+            self.processed += len(batch)
+            self.progress()
+
+    def copy(self, rows):
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(200), measurement_point varchar(50)) '
+                'ON COMMIT DROP'
+            )
+            for batch in self.batches(rows):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    (name, measurement_point)
+                    for key, name, measurement_point in batch
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+                self.processed += len(batch)
+                self.progress()
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_point) '
+                f'SELECT name, measurement_point FROM ingredient_import '
+                f'ON CONFLICT DO NOTHING'
+            )
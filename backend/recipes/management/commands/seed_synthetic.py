@@ -0,0 +1,264 @@
+import base64
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from recipes.autocomplete import ingredient_index
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, RecipeScore, ShoppingCart, Tag)
+from recipes.scores import refresh_scores
+from recipes.search import update_search
+from recipes.versions import TAGS, bump_version
+from users.models import Subscribe, User
+
+IMAGE = 'recipes/images/synthetic.gif'
+GIF = base64.b64decode(
+    'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+ADJECTIVES = (
+    'Домашний', 'Быстрый', 'Острый', 'Сырный', 'Летний', 'Пряный',
+    'Овощной', 'Куриный', 'Грибной', 'Томатный', 'Постный', 'Праздничный',
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'омлет', 'рагу', 'плов', 'борщ', 'паста',
+    'соус', 'гуляш', 'кекс', 'хлеб',
+)
+STEPS = (
+    'Нарежьте', 'Обжарьте', 'Смешайте', 'Запеките', 'Отварите',
+    'Посолите', 'Остудите', 'Подавайте',
+)
+
+
+class Zipf:
+    """Выбор из population с весом 1 / rank ** exponent.
+
+    Порядок population перемешивается, чтобы популярность не совпадала
+    с порядком id.
+    """
+
+    def __init__(self, population, exponent, rng):
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)))
+        self.rng = rng
+
+    def __len__(self):
+        return len(self.population)
+
+    def choices(self, k):
+        return self.rng.choices(self.population, cum_weights=self.weights,
+                                k=k)
+
+    def distinct(self, k):
+        """До k разных элементов: повторы выборки отбрасываются."""
+        return list(dict.fromkeys(self.choices(k)))
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, рецепты, избранное, '
+            'корзины и подписки для нагрузочных тестов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=2000, type=int)
+        parser.add_argument('--recipes', default=20000, type=int)
+        parser.add_argument('--tags', default=10, type=int,
+                            help='Сколько тегов должно быть в базе')
+        parser.add_argument('--ingredients', default=500, type=int,
+                            help='Сколько продуктов должно быть в базе; '
+                                 'недостающие создаются')
+        parser.add_argument('--ingredients-per-recipe', default=8, type=int)
+        parser.add_argument('--favorites', default=50000, type=int)
+        parser.add_argument('--carts', default=20000, type=int)
+        parser.add_argument('--subscriptions', default=20000, type=int)
+        parser.add_argument('--follows', default='10,1000,10000',
+                            help='Пользователи {prefix}_follows_N, '
+                                 'подписанные на N авторов, для ленты')
+        parser.add_argument('--zipf', default=1.1, type=float,
+                            help='Показатель распределения Ципфа')
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--password', default='synthetic')
+        parser.add_argument('--seed', default=0, type=int)
+        parser.add_argument('--batch-size', default=5000, type=int)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        try:
+            follows = [int(n) for n in options['follows'].split(',') if n]
+        except ValueError:
+            raise CommandError('--follows: список чисел через запятую')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.monotonic()
+        if not default_storage.exists(IMAGE):
+            default_storage.save(IMAGE, ContentFile(GIF))
+        with transaction.atomic():
+            tags = self.tags(options['tags'])
+            ingredients = self.ingredients(options['ingredients'])
+            users = self.users(options['users'])
+            recipes = self.recipes(options['recipes'], users, tags,
+                                   ingredients)
+            self.pairs(FavoriteRecipe, options['favorites'], users, recipes)
+            self.pairs(ShoppingCart, options['carts'], users, recipes)
+            self.subscriptions(options['subscriptions'], users)
+            for count in follows:
+                self.follower(count, users)
+            call_command('recount', stdout=self.stdout)
+            refresh_scores(full=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users and {len(recipes)} recipes '
+            f'in {time.monotonic() - started:.2f}s'))
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def tags(self, total):
+        existing = list(Tag.objects.all())
+        colors = [color for color, _ in Tag.COLORS]
+        start = len(existing)
+        new = [
+            Tag(name=f'{self.options["prefix"]} {i}',
+                slug=f'{self.options["prefix"]}-{i}',
+                color=colors[i % len(colors)])
+            for i in range(start, total)
+        ]
+        Tag.objects.bulk_create(new, ignore_conflicts=True)
+        if new:
+            transaction.on_commit(lambda: bump_version(TAGS))
+        self.log(f'{len(new)} tags')
+        return Zipf(Tag.objects.values_list('pk', flat=True), 1,
+                    self.rng)
+
+    def ingredients(self, total):
+        start = Ingredient.objects.count()
+        new = [
+            Ingredient(name=f'{self.options["prefix"]} продукт {i}',
+                       measurement_point='г')
+            for i in range(start, total)
+        ]
+        Ingredient.objects.bulk_create(new, batch_size=self.batch_size,
+                                       ignore_conflicts=True)
+        if new:
+            transaction.on_commit(ingredient_index.invalidate)
+        self.log(f'{len(new)} ingredients')
+        return Zipf(Ingredient.objects.values_list('pk', flat=True),
+                    self.options['zipf'], self.rng)
+
+    def users(self, total):
+        prefix = self.options['prefix']
+        start = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(self.options['password'])
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for i in range(start, start + total)
+        ], batch_size=self.batch_size)
+        self.log(f'{len(users)} users')
+        return [user.pk for user in users]
+
+    def recipes(self, total, users, tags, ingredients):
+        """Авторы, теги и продукты рецептов выбираются по Ципфу."""
+        authors = Zipf(users, self.options['zipf'], self.rng)
+        names = Zipf([f'{adjective} {dish}' for adjective in ADJECTIVES
+                      for dish in DISHES], self.options['zipf'], self.rng)
+        per_recipe = self.options['ingredients_per_recipe']
+        created = []
+        for start in range(0, total, self.batch_size):
+            size = min(self.batch_size, total - start)
+            recipes = Recipe.objects.bulk_create([
+                Recipe(author_id=author, name=f'{name} №{start + i}',
+                       text=self.text(), image=IMAGE,
+                       cooking_time=self.rng.randint(5, 180))
+                for i, (author, name) in enumerate(zip(
+                    authors.choices(size), names.choices(size)))
+            ])
+            links, amounts = [], []
+            for recipe in recipes:
+                links += [
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+                    for tag in tags.distinct(self.rng.randint(1, 3))
+                ]
+                amounts += [
+                    IngredientAmount(recipe_id=recipe.pk, ingredient_id=pk,
+                                     amount=self.rng.randint(1, 500))
+                    for pk in ingredients.distinct(
+                        self.rng.randint(1, 2 * per_recipe))
+                ]
+            RecipeScore.objects.bulk_create(
+                [RecipeScore(recipe=recipe) for recipe in recipes])
+            Recipe.tags.through.objects.bulk_create(links)
+            IngredientAmount.objects.bulk_create(
+                amounts, batch_size=self.batch_size)
+            update_search([recipe.pk for recipe in recipes])
+            created += [recipe.pk for recipe in recipes]
+            self.log(f'{len(created)} recipes')
+        return created
+
+    def text(self):
+        return ' '.join(
+            f'{step} {self.rng.choice(DISHES)}.'
+            for step in self.rng.sample(STEPS, self.rng.randint(2, 5)))
+
+    def pairs(self, model, total, users, recipes):
+        """Избранное или корзина: активные пользователи и рецепты по Ципфу.
+
+        Даты разбросаны по окну трендов, чтобы сортировке trending было
+        что считать.
+        """
+        if not recipes:
+            return
+        zipf = self.options['zipf']
+        pairs = set(zip(Zipf(users, zipf, self.rng).choices(total),
+                        Zipf(recipes, zipf, self.rng).choices(total)))
+        window = timedelta(days=30).total_seconds()
+        model.objects.bulk_create([
+            model(user_id=user, recipe_id=recipe,
+                  created=self.now - timedelta(
+                      seconds=self.rng.uniform(0, window)))
+            for user, recipe in pairs
+        ], batch_size=self.batch_size, ignore_conflicts=True)
+        self.log(f'{len(pairs)} {model._meta.verbose_name_plural}')
+
+    def subscriptions(self, total, users):
+        authors = Zipf(users, self.options['zipf'], self.rng)
+        pairs = {
+            (user, author)
+            for user, author in zip(self.rng.choices(users, k=total),
+                                    authors.choices(total))
+            if user != author
+        }
+        Subscribe.objects.bulk_create(
+            [Subscribe(user_id=user, author_id=author)
+             for user, author in pairs],
+            batch_size=self.batch_size)
+        self.log(f'{len(pairs)} subscriptions')
+
+    def follower(self, count, users):
+        """Пользователь, подписанный на count авторов (для ленты)."""
+        username = f'{self.options["prefix"]}_follows_{count}'
+        if User.objects.filter(username=username).exists():
+            self.log(f'{username} already exists')
+            return
+        if count > len(users):
+            self.stderr.write(
+                f'{username}: only {len(users)} authors available')
+        user = User.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            first_name='Имя', last_name='Фамилия',
+            password=self.options['password'])
+        Subscribe.objects.bulk_create(
+            [Subscribe(user=user, author_id=author)
+             for author in self.rng.sample(users, min(count, len(users)))],
+            batch_size=self.batch_size)
+        self.log(f'{username} follows {min(count, len(users))} authors')
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.scores import refresh_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинги рецептов для сортировки '
+            '?ordering=popular|trending')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Перестроить таблицу рейтингов целиком')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = refresh_scores(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {rows} scores in {time.monotonic() - started:.2f}s'))
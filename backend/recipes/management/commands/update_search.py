@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.search import update_search
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы всех рецептов'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        update_search(Recipe.objects.values('pk'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Search vectors updated in {time.monotonic() - started:.2f}s'))
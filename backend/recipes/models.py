@@ -1,6 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from users.models import DerivedFieldsMixin, Subscribe
+from .indexes import SearchIndex
 
 User = get_user_model()
 
@@ -76,7 +83,54 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_relations(self):
+        """Автор, теги и ингредиенты одним набором запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки на автора для user."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_in_favorite=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_in_favorite=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def first_per_author(self, authors, limit=None):
+        """Последние limit рецептов каждого автора одним запросом."""
+        queryset = self.filter(author__in=authors)
+        if limit is None:
+            return queryset
+        return queryset.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('created').desc(), F('id').desc()),
+            )
+        ).filter(row_number__lte=limit)
+
+
+class Recipe(DerivedFieldsMixin, models.Model):
+    # Варианты картинки пишет фоновая задача, вектор - update_search.
+    DERIVED_FIELDS = ('favorites_count', 'carts_count', 'image_variants',
+                      'search_vector')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -97,6 +151,12 @@ class Recipe(models.Model):
         'Фото блюда',
         upload_to='recipes/images'
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии фото',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     name = models.CharField(
         'Название блюда',
         max_length=200,
@@ -115,11 +175,41 @@ class Recipe(models.Model):
         verbose_name='Дата добавления',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False
+    )
+
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=('-created', '-id'),
+                         name='recipe_created_id_idx'),
+            models.Index(fields=('author', '-created', '-id'),
+                         name='recipe_author_created_idx'),
+            SearchIndex(fields=('search_vector',),
+                        name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self):
         return f'Блюдо: {self.name}'
@@ -160,11 +250,15 @@ class IngredientAmount(models.Model):
 
 
 class ShoppingCart(models.Model):
+    # Отдельный индекс по user не нужен: его заменяет unique_cart, где
+    # user - ведущая колонка. (user, recipe) покрывает и выборку
+    # корзины, и проверку рецепта в ней.
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
-        related_name='shopping_cart'
+        related_name='shopping_cart',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -172,6 +266,11 @@ class ShoppingCart(models.Model):
         verbose_name='В корзине',
         related_name='shopping_cart'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -188,11 +287,14 @@ class ShoppingCart(models.Model):
 
 
 class FavoriteRecipe(models.Model):
+    # Отдельный индекс по user заменяет unique_favorite с ведущей
+    # колонкой user, как у ShoppingCart.
     user = models.ForeignKey(
         User,
         verbose_name='Пользователь',
         on_delete=models.CASCADE,
         related_name='favorite_recipe',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -200,6 +302,11 @@ class FavoriteRecipe(models.Model):
         on_delete=models.CASCADE,
         related_name='favorite_recipe'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -211,3 +318,29 @@ class FavoriteRecipe(models.Model):
 
     def __str__(self):
         return f'{self.user} follow {self.recipe}'
+
+
+class RecipeScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='score'
+    )
+    popular = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Популярность за последние дни', default=0)
+    refreshed = models.DateTimeField('Дата пересчёта', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=('-popular', '-recipe'),
+                         name='score_popular_idx'),
+            models.Index(fields=('-trending', '-recipe'),
+                         name='score_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popular:.2f} / {self.trending:.2f}'
@@ -0,0 +1,101 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FavoriteRecipe, Recipe, RecipeScore, ShoppingCart
+
+ORDERINGS = (
+    ('popular', 'Популярные'),
+    ('trending', 'Популярные за последние дни'),
+)
+
+
+def weighted_events():
+    weights = settings.RECIPE_SCORE_WEIGHTS
+    return ((FavoriteRecipe, weights['favorite']),
+            (ShoppingCart, weights['cart']))
+
+
+def popular_expression(prefix=''):
+    weights = settings.RECIPE_SCORE_WEIGHTS
+    return (F(f'{prefix}favorites_count') * weights['favorite']
+            + F(f'{prefix}carts_count') * weights['cart'])
+
+
+def has_events_since(since):
+    condition = Q()
+    for model, _ in weighted_events():
+        condition |= Exists(model.objects.filter(
+            recipe=OuterRef('pk'), created__gt=since))
+    return condition
+
+
+def trending_scores(now):
+    """Добавления за окно с весом, который падает вдвое за период полураспада.
+
+    Читаются только события из окна, поэтому стоимость пересчёта зависит
+    от активности за последние дни, а не от размера таблиц.
+    """
+    half_life = settings.RECIPE_TRENDING_HALF_LIFE.total_seconds()
+    since = now - settings.RECIPE_TRENDING_WINDOW
+    scores = defaultdict(float)
+    for model, weight in weighted_events():
+        for recipe, created in model.objects.filter(
+            created__gt=since
+        ).values_list('recipe_id', 'created').iterator():
+            age = max((now - created).total_seconds(), 0)
+            scores[recipe] += weight * 0.5 ** (age / half_life)
+    return scores
+
+
+@transaction.atomic
+def refresh_scores(full=False):
+    """Пересчитывает таблицу рейтингов и возвращает число записанных строк.
+
+    С full строка пишется для каждого рецепта. Без full popular
+    обновляется только там, где он разошёлся со счётчиками (так
+    учитываются и удаления из избранного, после которых не остаётся
+    событий с датой), а целиком пересчитываются рецепты с добавлениями
+    за окно и строки, у которых ещё остался trending.
+    """
+    now = timezone.now()
+    since = now - settings.RECIPE_TRENDING_WINDOW
+    trending = trending_scores(now)
+    recipes = Recipe.objects.annotate(popular=popular_expression())
+    changed = 0
+    if not full:
+        changed = RecipeScore.objects.exclude(
+            popular=popular_expression('recipe__')
+        ).update(popular=Subquery(
+            recipes.filter(pk=OuterRef('recipe')).values('popular')[:1]))
+        recipes = recipes.filter(
+            Q(score__trending__gt=0) | has_events_since(since))
+    scores = [
+        RecipeScore(recipe_id=pk, popular=popular,
+                    trending=trending.get(pk, 0), refreshed=now)
+        for pk, popular in recipes.values_list('pk', 'popular').iterator()
+    ]
+    RecipeScore.objects.bulk_create(
+        scores,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=('recipe',),
+        update_fields=('popular', 'trending', 'refreshed'),
+    )
+    return changed + len(scores)
+
+
+def order_by_score(queryset, field):
+    """Сортировка по готовому рейтингу.
+
+    Строка рейтинга создаётся вместе с рецептом, но рецепт без неё
+    (например, до первого refresh_scores после загрузки данных) не
+    должен пропадать из списка: соединение внешнее, а отсутствующий
+    рейтинг считается нулевым.
+    """
+    return queryset.order_by(
+        Coalesce(f'score__{field}', 0.0).desc(), '-pk')
@@ -0,0 +1,149 @@
+import re
+from collections import defaultdict
+from threading import Lock
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection, transaction
+from django.db.models import (Case, F, FloatField, OuterRef, Subquery, Value,
+                              When)
+
+from .autocomplete import normalize
+from .models import IngredientAmount, Recipe
+from .versions import RECIPES, bump_version, get_version
+
+CONFIG = 'russian'
+# Веса ts_rank по умолчанию для меток A, B и C.
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой',
+    'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов', 'ев', 'ам',
+    'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'а', 'я', 'о', 'е', 'ы', 'и',
+    'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+WORD = re.compile(r'\w+')
+
+
+def uses_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def ingredient_names():
+    """Названия ингредиентов рецепта OuterRef('pk') одной строкой."""
+    return Subquery(
+        IngredientAmount.objects.filter(recipe=OuterRef('pk')).order_by(
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+
+
+def search_vector():
+    return (
+        SearchVector('name', weight='A', config=CONFIG)
+        + SearchVector(ingredient_names(), weight='B', config=CONFIG)
+        + SearchVector('text', weight='C', config=CONFIG)
+    )
+
+
+def update_search(recipes):
+    """Пересчитывает поисковые векторы recipes (id или queryset)."""
+    if uses_postgresql():
+        Recipe.objects.filter(pk__in=recipes).update(
+            search_vector=search_vector())
+    else:
+        transaction.on_commit(recipe_index.invalidate)
+
+
+def forget_search():
+    """Вызывается после удаления рецептов, нужно только индексу в памяти."""
+    if not uses_postgresql():
+        transaction.on_commit(recipe_index.invalidate)
+
+
+def stem(word):
+    """Грубое отсечение окончаний вместо русского словаря PostgreSQL."""
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def terms(text):
+    return [stem(word) for word in WORD.findall(normalize(text))]
+
+
+class RecipeIndex:
+    """Обратный индекс рецептов в памяти процесса для баз без tsvector.
+
+    Ранжирование как у ts_rank без нормализации: каждое вхождение слова
+    запроса добавляет вес поля (название > ингредиенты > описание),
+    в выдачу попадают рецепты, где есть все слова запроса.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.postings = {}
+        self.lock = Lock()
+
+    def build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        documents = defaultdict(list)
+        for pk, name, text in Recipe.objects.values_list(
+                'pk', 'name', 'text').iterator():
+            documents[pk] += [(name, WEIGHTS['A']), (text, WEIGHTS['C'])]
+        for pk, name in IngredientAmount.objects.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            documents[pk].append((name, WEIGHTS['B']))
+        for pk, fields in documents.items():
+            for text, weight in fields:
+                for term in terms(text):
+                    postings[term][pk] += weight
+        self.postings = postings
+
+    def refresh(self):
+        version = get_version(RECIPES)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build()
+                self.version = version
+
+    def invalidate(self):
+        bump_version(RECIPES)
+
+    def search(self, query):
+        """{id рецепта: ранг} для рецептов со всеми словами запроса."""
+        self.refresh()
+        ranks = None
+        for term in set(terms(query)):
+            matches = self.postings.get(term, {})
+            if ranks is None:
+                ranks = dict(matches)
+                continue
+            ranks = {pk: rank + matches[pk]
+                     for pk, rank in ranks.items() if pk in matches}
+        return ranks or {}
+
+
+recipe_index = RecipeIndex()
+
+
+def search_recipes(queryset, query):
+    """Рецепты queryset, подходящие под запрос, по убыванию релевантности."""
+    if uses_postgresql():
+        query = SearchQuery(query, config=CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-created', '-id')
+    ranks = recipe_index.search(query)
+    return queryset.filter(pk__in=ranks).annotate(
+        rank=Case(
+            *(When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()),
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+    ).order_by('-rank', '-created', '-id')
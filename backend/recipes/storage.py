@@ -0,0 +1,67 @@
+import hashlib
+import os
+import posixpath
+import time
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - sha256 его содержимого.
+
+    Одинаковые файлы хранятся один раз: если блоб с таким хешем уже
+    есть, запись пропускается, а у файла обновляется mtime. Файлы
+    никогда не перезаписываются под тем же именем, поэтому их можно
+    кэшировать бессрочно. Удалять блобы нужно через delete_stale: по
+    свежему mtime видно, что их только что загрузили заново.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            # Свежий mtime не даст удалить блоб, пока ссылка на него
+            # ещё не закоммичена.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+    def delete_stale(self, name, grace):
+        """Удаляет блоб, если его не загружали заново grace секунд.
+
+        Файл сначала переименовывается: параллельная загрузка тех же
+        байт либо успела обновить mtime, и файл возвращается на место,
+        либо уже не найдёт его и запишет заново. Возвращает True, если
+        файл удалён.
+        """
+        path = self.path(name)
+        trash = f'{path}.{uuid.uuid4().hex}.deleted'
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(trash).st_mtime < grace:
+            # Содержимое то же, поэтому затереть новую запись не страшно.
+            os.replace(trash, path)
+            return False
+        os.remove(trash)
+        return True
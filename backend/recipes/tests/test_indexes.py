@@ -0,0 +1,34 @@
+import json
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from recipes.management.commands.check_indexes import (hot_queries,
+                                                       plan_indexes)
+from recipes.models import Recipe, RecipeScore
+from users.models import User
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN только на PostgreSQL')
+class HotQueryIndexesTest(TestCase):
+    """Горячие запросы могут идти по своим индексам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password')
+        recipe = Recipe.objects.create(
+            author=author, name='Суп', text='Описание', cooking_time=10,
+            image='recipes/images/recipe.png')
+        RecipeScore.objects.create(recipe=recipe)
+
+    def test_hot_queries_use_indexes(self):
+        # На маленьких таблицах планировщик выбирает Seq Scan. SET LOCAL
+        # действует до отката транзакции теста.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset, index in hot_queries():
+            with self.subTest(name):
+                self.assertIn(index, plan_indexes(
+                    json.loads(queryset.explain(format='json'))))
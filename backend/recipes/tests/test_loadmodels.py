@@ -0,0 +1,36 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from recipes.models import Ingredient
+
+
+class LoadModelsTest(TestCase):
+
+    def load(self, content, suffix):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix=suffix, encoding='utf-8', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        stderr = StringIO()
+        call_command('loadmodels', f.name, '--no-copy', stdout=StringIO(),
+                     stderr=stderr)
+        return stderr.getvalue()
+
+    def test_malformed_csv_rows_are_skipped(self):
+        errors = self.load('мука,г\n\nсоль\n,\nсахар,г\n', '.csv')
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', flat=True)),
+            {'мука', 'сахар'})
+        self.assertIn('Skipped 1 malformed rows: 3', errors)
+
+    def test_malformed_json_items_are_skipped(self):
+        errors = self.load(
+            '[{"name": "мука", "measurement_unit": "г"}, {"name": "соль"}]',
+            '.json')
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', flat=True)),
+            ['мука'])
+        self.assertIn('Skipped 1 malformed rows: 2', errors)
@@ -0,0 +1,74 @@
+from django.contrib.admin.sites import site
+from django.db.models import F
+from django.test import RequestFactory, TestCase
+from recipes.models import Recipe, RecipeScore
+from recipes.scores import order_by_score, refresh_scores
+from users.models import User
+
+
+class RefreshScoresTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/images/recipe.png',
+                favorites_count=2)
+            for number in range(3)
+        ]
+        refresh_scores(full=True)
+
+    def popular(self):
+        return list(RecipeScore.objects.order_by('recipe').values_list(
+            'popular', flat=True))
+
+    def test_incremental_writes_only_changed_rows(self):
+        self.assertEqual(self.popular(), [2, 2, 2])
+        # Удаление из избранного не оставляет события с датой.
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(
+            favorites_count=F('favorites_count') - 1)
+        self.assertEqual(refresh_scores(), 1)
+        self.assertEqual(self.popular(), [2, 1, 2])
+        self.assertEqual(refresh_scores(), 0)
+
+
+class OrderByScoreTest(TestCase):
+    """Рецепты без строки рейтинга остаются в сортировке по рейтингу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10,
+                image='recipes/images/recipe.png')
+            for number in range(3)
+        ]
+        RecipeScore.objects.bulk_create([
+            RecipeScore(recipe=cls.recipes[0], popular=1, trending=3),
+            RecipeScore(recipe=cls.recipes[1], popular=2),
+        ])
+
+    def ordered(self, field):
+        return list(order_by_score(Recipe.objects.all(), field))
+
+    def test_missing_score_counts_as_zero(self):
+        first, second, missing = self.recipes
+        self.assertEqual(self.ordered('popular'), [second, first, missing])
+        self.assertEqual(self.ordered('trending'), [first, missing, second])
+
+    def test_recipe_added_in_admin_has_score(self):
+        request = RequestFactory().post('/admin/')
+        request.user = self.author
+        recipe = Recipe(author=self.author, name='Из админки',
+                        text='Описание', cooking_time=5,
+                        image='recipes/images/recipe.png')
+        site._registry[Recipe].save_model(request, recipe, None, False)
+        self.assertTrue(RecipeScore.objects.filter(recipe=recipe).exists())
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from recipes.images import release_image
+
+NAME = 'recipes/images/photo.png'
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Блоб, загруженный заново, не удаляется в течение grace-периода."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media, RECIPE_IMAGE_GRACE=60)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def save(self):
+        return default_storage.save(NAME, ContentFile(b'image'))
+
+    def age(self, name, seconds=3600):
+        past = time.time() - seconds
+        os.utime(default_storage.path(name), (past, past))
+
+    def modified(self, name):
+        return os.stat(default_storage.path(name)).st_mtime
+
+    def test_dedup_hit_refreshes_mtime(self):
+        name = self.save()
+        self.age(name)
+        self.assertEqual(self.save(), name)
+        self.assertGreater(self.modified(name), time.time() - 60)
+
+    def test_delete_stale(self):
+        name = self.save()
+        self.assertFalse(default_storage.delete_stale(name, 60))
+        self.assertTrue(default_storage.exists(name))
+        self.age(name)
+        self.assertTrue(default_storage.delete_stale(name, 60))
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(os.listdir(os.path.dirname(
+            default_storage.path(name))), [])
+
+    def test_release_keeps_blob_uploaded_again(self):
+        name = self.save()
+        self.age(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            release_image(name, {})
+            # Тот же файл загружают для другого рецепта, пока первая
+            # транзакция ещё не закоммичена.
+            self.save()
+        self.assertTrue(default_storage.exists(name))
+
+    def test_release_deletes_old_blob(self):
+        name = self.save()
+        self.age(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            release_image(name, {})
+        self.assertFalse(default_storage.exists(name))
+
+    def test_gc_media_keeps_fresh_blobs(self):
+        old, fresh = self.save(), default_storage.save(
+            NAME, ContentFile(b'other image'))
+        self.age(old)
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(fresh))
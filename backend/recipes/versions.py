@@ -0,0 +1,31 @@
+import time
+
+from django.core.cache import cache
+
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+RECIPES = 'recipes'
+
+
+def get_version(table):
+    """Метка версии справочника: время его последнего изменения.
+
+    Если метки в кэше нет, она создаётся заново, что просто
+    равносильно изменению справочника.
+    """
+
+    key = f'table_version:{table}'
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, time.time(), None)
+    return cache.get(key)
+
+
+def bump_version(table):
+    cache.set(f'table_version:{table}', time.time(), None)
+
+
+def bump_versions(tables):
+    cache.set_many(
+        {f'table_version:{table}': time.time() for table in tables}, None)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from recipes.admin import CountedRelationAdmin
 
 from .models import User, Subscribe
 
@@ -7,18 +8,20 @@ EMPTY_VALUE = '-пусто-'
 
 class UserAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'username', 'first_name', 'last_name', 'email', 'password'
+        'id', 'username', 'first_name', 'last_name', 'email', 'password',
+        'recipes_count', 'followers_count'
     )
     search_fields = ('username', 'first_name', 'last_name')
     list_filter = ('username', 'email')
     empty_value_display = EMPTY_VALUE
 
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(CountedRelationAdmin):
     list_display = ('id', 'user', 'author')
     search_fields = ('user',)
     list_filter = ('user',)
     empty_value_display = EMPTY_VALUE
+    counter = (User, 'author', 'followers_count')
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,24 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Min
+from users.models import Subscribe
+
+
+class Command(BaseCommand):
+    help = ('Удаляет повторные подписки перед миграцией, добавляющей '
+            'ограничение unique_recording')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if (Subscribe._meta.db_table
+                not in connection.introspection.table_names()):
+            self.stdout.write('No subscriptions table yet')
+            return
+        first = Subscribe.objects.values('user', 'author').annotate(
+            first=Min('pk')).values('first')
+        deleted = Subscribe.objects.exclude(pk__in=first).delete()[0]
+        if deleted:
+            call_command('recount', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} duplicate subscriptions'))
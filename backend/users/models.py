@@ -3,7 +3,30 @@ from django.db import models
 from django.utils.translation import gettext as _
 
 
-class User(AbstractUser):
+class DerivedFieldsMixin:
+    """Не даёт полному save() затереть поля, которые меняются через F().
+
+    Экземпляр хранит значения счётчиков на момент чтения, поэтому
+    save() без update_fields вернул бы их назад поверх чужих
+    инкрементов. Такие поля перечислены в DERIVED_FIELDS и пишутся
+    только явным update_fields или update().
+    """
+
+    DERIVED_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(DerivedFieldsMixin, AbstractUser):
+    DERIVED_FIELDS = ('recipes_count', 'followers_count', 'cart_version')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
     email = models.EmailField(
@@ -24,6 +47,26 @@ class User(AbstractUser):
         'Фамилия',
         max_length=50,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
+    cart_version = models.PositiveIntegerField(
+        'Версия списка покупок',
+        default=0,
+        editable=False
+    )
+    # Входит в ETag рецептов автора: профиль выводится в каждом рецепте.
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         ordering = ('id',)
@@ -35,10 +78,12 @@ class User(AbstractUser):
 
 
 class Subscribe(models.Model):
+    # Отдельный индекс по user не нужен: его заменяет unique_recording.
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name=_('Пользователь'))
+        verbose_name=_('Пользователь'),
+        db_index=False)
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='following',
@@ -51,5 +96,7 @@ class Subscribe(models.Model):
         ordering = ['-id']
         verbose_name = _('Подписка')
         verbose_name_plural = _('Подписки')
-        models.UniqueConstraint(
-            fields=['user', 'author'], name='unique_recording')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_recording')
+        ]